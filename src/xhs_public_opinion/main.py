@@ -2,8 +2,8 @@
 import sys
 import warnings
 import os
-import json
 import re
+import orjson
 import pandas as pd
 from typing import List
 from datetime import datetime
@@ -19,7 +19,7 @@ from xhs_public_opinion.tools import (
     SOVVisualizationTool,
     BrandSentimentVisualizationTool
 )
-from xhs_public_opinion.store.database import SupabaseDatabase
+from xhs_public_opinion.store.database import get_database
 
 logger = logging.getLogger(__name__)
 
@@ -139,7 +139,7 @@ def _analyze_top_notes(csv_path: str, top_n: int = 100) -> bool:
     """对前N名笔记进行多模态分析"""
     try:
         # 初始化数据库连接
-        db = SupabaseDatabase()
+        db = get_database()
         if not db.is_connected():
             print("   ❌ 数据库连接失败")
             return False
@@ -160,7 +160,7 @@ def _analyze_top_notes(csv_path: str, top_n: int = 100) -> bool:
             return False
         
         # 3. 解析数据
-        notes_data = json.loads(raw_data)
+        notes_data = orjson.loads(raw_data)
         all_notes = notes_data.get('notes', [])
         total_notes = len(all_notes)
         
@@ -189,35 +189,21 @@ def _analyze_top_notes(csv_path: str, top_n: int = 100) -> bool:
                              "image" if note.get('image_list') else "text"
                 
                 # 分析内容
-                result = multimodal_analyzer._run(json.dumps(note, ensure_ascii=False), content_type)
-                parsed_result = json.loads(result)
+                result = multimodal_analyzer._run(orjson.dumps(note, default=str).decode('utf-8'), content_type)
+                parsed_result = orjson.loads(result)
                 
                 if parsed_result.get('_analysis_failed', False):
                     print(f"      ⚠️ 分析失败: {parsed_result.get('_error_message', '未知错误')}")
                     failed_count += 1
                     continue
                 
-                # 添加笔记ID并直接写入数据库
-                parsed_result['note_id'] = note['note_id']
-                write_result = db.update_single_note_analysis_json(parsed_result)
-                
-                # 解析写入结果
-                try:
-                    write_response = json.loads(write_result)
-                    if write_response.get('success', False):
-                        success_count += 1
-                        print(f"      ✅ 分析完成")
-                    else:
-                        failed_count += 1
-                        print(f"      ❌ 写入失败: {write_response.get('message', '未知错误')}")
-                except:
-                    # 如果解析失败，根据返回内容判断
-                    if "✅" in write_result:
-                        success_count += 1
-                        print(f"      ✅ 分析完成")
-                    else:
-                        failed_count += 1
-                        print(f"      ❌ 写入失败: {write_result}")
+                # 分析结果立即写入数据库（复用连接池中的连接），中途异常退出时已完成的分析不会丢失
+                if db.update_analysis_result(note['note_id'], parsed_result):
+                    success_count += 1
+                    print(f"      ✅ 分析完成并已写入: {note['note_id']}")
+                else:
+                    failed_count += 1
+                    print(f"      ❌ 写入失败: {note['note_id']}")
                     
             except Exception as e:
                 failed_count += 1
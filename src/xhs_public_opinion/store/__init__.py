@@ -6,7 +6,7 @@ This module provides unified data access interfaces for:
 - File operations (FileManager)
 """
 
-from .database import SupabaseDatabase, XHSNote
+from .database import SupabaseDatabase, XHSNote, get_database
 from .file_manager import FileManager
 
-__all__ = ['SupabaseDatabase', 'XHSNote', 'FileManager'] 
\ No newline at end of file
+__all__ = ['SupabaseDatabase', 'XHSNote', 'FileManager', 'get_database'] 
\ No newline at end of file
@@ -5,16 +5,50 @@
 
 import os
 import json
+import inspect
+import httpx
+import orjson
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, Optional, List
-from supabase import create_client
+from typing import Dict, Any, Optional, List, Tuple
+from supabase import create_client, ClientOptions
+from postgrest.exceptions import APIError
+from postgrest.types import CountMethod, ReturnMethod
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# note_id批量查询参数：单次IN查询的id数量上限（避免URL过长），以及并发请求数
+# 200个24位note_id约5KB，低于常见网关8KB的URL长度限制
+NOTE_ID_CHUNK_SIZE = 200
+NOTE_FETCH_MAX_WORKERS = 8
+
+# PostgREST会话连接池：保持keep-alive连接，避免并发分块查询和连续调用重复TLS握手
+HTTP_POOL_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=30)
+# 品牌分析只需要笔记的文本、图片和视频字段（id用于键集分页），不拉取整行
+ANALYSIS_NOTE_COLUMNS = "id,note_id,title,desc,type,video_url,image_list,tag_list,nickname,author_id"
+# 批量插入时单次请求的行数上限，避免请求体过大
+INSERT_CHUNK_SIZE = 500
+# 数据库HTTP请求超时（秒），默认120秒过长，慢查询时会长时间占用连接池
+POSTGREST_TIMEOUT = 30
+# 较早的supabase版本的ClientOptions不支持传入自定义httpx客户端
+CLIENT_OPTIONS_ACCEPT_HTTPX_CLIENT = 'httpx_client' in inspect.signature(ClientOptions).parameters
+
+def _json_dumps(data: Any) -> str:
+    """序列化*_json接口的返回结果（orjson输出UTF-8，等价于ensure_ascii=False；遇到不支持的类型回退到json）"""
+    try:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    except TypeError:
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+def _is_missing_rpc_error(error: Exception) -> bool:
+    """判断RPC调用失败是否因为函数未部署（PostgREST返回PGRST202或404）"""
+    return isinstance(error, APIError) and str(error.code) in ("PGRST202", "404")
+
 class XHSNote():
     """小红书笔记数据模型"""
     id: int
@@ -44,7 +78,34 @@ class SupabaseDatabase:
             logger.warning("Supabase环境变量未设置，数据库功能将受限")
             self.client = None
         else:
-            self.client = create_client(self.url, self.key)
+            self.client = create_client(self.url, self.key, options=self._build_client_options())
+        
+        # 服务端RPC函数不可用时记录下来，避免后续调用重复探测
+        self._merge_rpc_available = True
+        self._rrf_rpc_available = True
+    
+    @staticmethod
+    def _build_client_options() -> ClientOptions:
+        """构建Supabase客户端配置（仅使用anon key访问，不涉及用户会话，关闭token自动刷新和会话持久化）"""
+        if not CLIENT_OPTIONS_ACCEPT_HTTPX_CLIENT:
+            logger.info("当前supabase版本不支持自定义httpx客户端，使用默认连接配置")
+            return ClientOptions(
+                auto_refresh_token=False,
+                persist_session=False,
+                postgrest_client_timeout=POSTGREST_TIMEOUT,
+            )
+        
+        # 传入带连接池配置的httpx客户端，PostgREST直接将其作为会话（请求地址和鉴权头由PostgREST逐请求附加）
+        return ClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            httpx_client=httpx.Client(
+                timeout=POSTGREST_TIMEOUT,
+                limits=HTTP_POOL_LIMITS,
+                follow_redirects=True,
+                http2=True,
+            ),
+        )
     
     def is_connected(self) -> bool:
         """检查数据库连接是否可用"""
@@ -52,8 +113,20 @@ class SupabaseDatabase:
     
     # ==================== 基础笔记操作 ====================
     
-    def get_unprocessed_notes(self, limit: int = 10) -> list:
-        """获取未处理的笔记数据"""
+    def get_unprocessed_notes(self, limit: int = 10, after_id: int = 0, columns: str = ANALYSIS_NOTE_COLUMNS) -> list:
+        """获取未处理的笔记数据（按id键集分页）
+        
+        调用方传入上一页最大的id作为after_id继续读取，数据库只需从该id之后扫描，
+        不必每次跳过已处理的记录。配合部分索引效果最佳：
+        
+            create index if not exists xhs_note_unprocessed_id_idx on xhs_note (id)
+            where brand_list is null or brand_list = '[]';
+        
+        Args:
+            limit: 本页最多返回的条数
+            after_id: 只返回id大于该值的记录，默认从头读取
+            columns: 需要返回的列（逗号分隔），默认只返回品牌分析用到的列
+        """
         if not self.client:
             logger.error("数据库客户端未初始化")
             return []
@@ -61,8 +134,10 @@ class SupabaseDatabase:
         try:
             response = (
                 self.client.table("xhs_note")
-                .select("*")
+                .select(columns)
+                .gt("id", after_id)
                 .or_("brand_list.is.null,brand_list.eq.[]")
+                .order("id")
                 .limit(limit)
                 .execute()
             )
@@ -71,8 +146,8 @@ class SupabaseDatabase:
             logger.error(f"获取笔记数据失败: {e}")
             return []
     
-    def get_unprocessed_notes_by_ids(self, note_ids: list) -> list:
-        """根据note_id列表获取未处理的笔记数据（只返回brand_list为空的记录）"""
+    def get_unprocessed_notes_by_ids(self, note_ids: list, columns: str = ANALYSIS_NOTE_COLUMNS) -> list:
+        """根据note_id列表获取未处理的笔记数据（只返回brand_list为空的记录，默认只返回品牌分析用到的列）"""
         if not self.client:
             logger.error("数据库客户端未初始化")
             return []
@@ -83,7 +158,7 @@ class SupabaseDatabase:
             
             response = (
                 self.client.table("xhs_note")
-                .select("*")
+                .select(columns)
                 .in_("note_id", note_ids)
                 .or_("brand_list.is.null,brand_list.eq.[]")  # 只获取未处理的笔记
                 .execute()
@@ -93,6 +168,16 @@ class SupabaseDatabase:
             logger.error(f"根据note_id列表获取未处理笔记数据失败: {e}")
             return []
     
+    @staticmethod
+    def _build_analysis_update(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+        """从分析结果中取出需要写回xhs_note的字段"""
+        return {
+            "brand_list": analysis_result.get("brand_list", []),
+            "spu_list": analysis_result.get("spu_list", []),
+            "emotion_dict": analysis_result.get("emotion_dict", {}),
+            "evaluation_dict": analysis_result.get("evaluation_dict", {}),
+        }
+    
     def update_analysis_result(self, note_id: str, analysis_result: Dict[str, Any]) -> bool:
         """更新分析结果到数据库"""
         if not self.client:
@@ -100,30 +185,67 @@ class SupabaseDatabase:
             return False
             
         try:
-            update_data = {
-                "brand_list": analysis_result.get("brand_list", []),
-                "spu_list": analysis_result.get("spu_list", []),
-                "emotion_dict": analysis_result.get("emotion_dict", {}),
-                "evaluation_dict": analysis_result.get("evaluation_dict", {}),
-            }
+            update_data = self._build_analysis_update(analysis_result)
             
+            # 只需要知道是否命中记录：返回受影响行数而不是整行数据
             response = (
                 self.client.table("xhs_note")
-                .update(update_data)
+                .update(update_data, count=CountMethod.exact, returning=ReturnMethod.minimal)
                 .eq("note_id", note_id)
                 .execute()
             )
             
-            return bool(response.data)
+            # 未返回受影响行数或行数为0都视为写入失败，不做乐观判断
+            if not response.count:
+                logger.warning(f"更新笔记:{note_id} 分析结果未命中任何记录")
+                return False
+            return True
             
         except Exception as e:
             logger.error(f"更新笔记:{note_id} 分析结果失败: {e}")
             return False
             
+    def batch_update_analysis_results(self, analysis_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量写回多条笔记的分析结果（并发逐条update，只更新已存在的笔记，不会新建记录）
+        
+        Args:
+            analysis_results: 分析结果列表，每条需包含note_id
+            
+        Returns:
+            {"success": 是否全部写入, "updated_count": 写入条数, "failed_ids": 写入失败的note_id}
+        """
+        if not self.client:
+            return {"success": False, "error": "数据库客户端未初始化", "updated_count": 0, "failed_ids": []}
+        
+        # 一次遍历完成校验和组装；同一note_id只保留最后一条
+        payload = {
+            result["note_id"]: result
+            for result in analysis_results if isinstance(result, dict) and result.get("note_id")
+        }
+        if not payload:
+            return {"success": True, "updated_count": 0, "failed_ids": []}
+        
+        # 逐条update为纯网络IO，并发写入；并发数与分块查询保持一致，不超过连接池上限
+        with ThreadPoolExecutor(max_workers=min(NOTE_FETCH_MAX_WORKERS, len(payload))) as executor:
+            written = list(executor.map(self.update_analysis_result, payload.keys(), payload.values()))
+        failed_ids = [note_id for note_id, ok in zip(payload, written) if not ok]
+        logger.info(f"[Database] 批量写入 {len(payload) - len(failed_ids)}/{len(payload)} 条笔记分析结果")
+        return {
+            "success": not failed_ids,
+            "updated_count": len(payload) - len(failed_ids),
+            "failed_ids": failed_ids,
+        }
+            
     # ==================== 搜索结果操作 ====================
     
-    def get_search_results_by_keyword(self, keyword: str) -> List[Dict[str, Any]]:
-        """根据关键词获取搜索结果（限定本周内的数据）"""
+    def get_search_results_by_keyword(self, keyword: str, columns: str = "*") -> List[Dict[str, Any]]:
+        """根据关键词获取搜索结果（限定本周内的数据）
+        
+        Args:
+            keyword: 搜索关键词
+            columns: 需要返回的列（逗号分隔），默认返回全部列
+        """
         if not self.client:
             logger.error("数据库客户端未初始化")
             return []
@@ -142,7 +264,7 @@ class SupabaseDatabase:
             
             response = (
                 self.client.table("xhs_search_result")
-                .select("*")
+                .select(columns)
                 .eq("keyword", keyword)
                 .gte("created_at", week_start.isoformat())  # 大于等于本周一开始时间
                 .order("rank", desc=False)  # 按排名升序排列
@@ -155,6 +277,79 @@ class SupabaseDatabase:
             logger.error(f"获取搜索结果失败: {e}")
             return []
     
+    def get_search_results_with_notes_by_keyword(self, keyword: str) -> Optional[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """通过服务端RPC一次性获取关键词本周搜索结果及对应笔记详情（数据库内完成JOIN）
+        
+        函数定义见 supabase/migrations/20250610000000_merge_keyword_data.sql
+        
+        Returns:
+            (搜索结果列表, 去重后的笔记详情列表)；RPC不可用或调用失败时返回None，由调用方回退到分步查询
+        """
+        if not self.client or not self._merge_rpc_available:
+            return None
+        
+        try:
+            today = datetime.now()
+            week_start = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+            
+            response = self.client.rpc(
+                "merge_keyword_data", {"kw": keyword, "since": week_start.isoformat()}
+            ).execute()
+        except Exception as e:
+            # 只有函数未部署时才不再尝试；超时、5xx等临时错误仅本次回退
+            if _is_missing_rpc_error(e):
+                logger.info(f"[Database] merge_keyword_data RPC未部署，回退到分步查询: {e}")
+                self._merge_rpc_available = False
+            else:
+                logger.warning(f"[Database] merge_keyword_data RPC调用失败，本次回退到分步查询: {e}")
+            return None
+        
+        search_results = []
+        note_details = {}
+        for row in response.data:
+            note = row.pop("note", None)
+            search_results.append(row)
+            if note:
+                note_details[note["note_id"]] = note
+        
+        logger.info(f"[Database] RPC查询到 {len(search_results)} 条本周内的搜索结果，{len(note_details)} 条笔记详情")
+        return search_results, list(note_details.values())
+    
+    def get_rrf_rankings_by_keyword(self, keyword: str, k: int = 60, top_n: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """通过服务端RPC计算关键词本周搜索结果的RRF排名（数据库内聚合，只返回每个note_id一行）
+        
+        函数定义见 supabase/migrations/20250610000100_xhs_rrf_top.sql
+        （同一账户多次出现时取排名最大的一条，代表记录取排名最靠前的一条）
+        
+        Args:
+            keyword: 搜索关键词
+            k: RRF常数
+            top_n: 只返回分数最高的前N个note_id，None表示全部
+            
+        Returns:
+            按RRF分数降序排列的记录列表；RPC不可用或调用失败时返回None，由调用方回退到本地计算
+        """
+        if not self.client or not self._rrf_rpc_available:
+            return None
+        
+        try:
+            today = datetime.now()
+            week_start = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+            
+            response = self.client.rpc(
+                "xhs_rrf_top", {"kw": keyword, "since": week_start.isoformat(), "k": k, "topn": top_n}
+            ).execute()
+        except Exception as e:
+            if _is_missing_rpc_error(e):
+                logger.info(f"[Database] xhs_rrf_top RPC未部署，回退到本地RRF计算: {e}")
+                self._rrf_rpc_available = False
+            else:
+                logger.warning(f"[Database] xhs_rrf_top RPC调用失败，本次回退到本地RRF计算: {e}")
+            return None
+        
+        logger.info(f"[Database] RPC计算得到 {len(response.data)} 个note_id的RRF排名")
+        return response.data
+    
     def get_search_results_by_keyword_with_date_range(
         self, 
         keyword: str, 
@@ -200,8 +395,15 @@ class SupabaseDatabase:
             logger.error(f"获取搜索结果失败: {e}")
             return []
     
-    def get_note_details_by_ids(self, note_ids: List[str]) -> List[Dict[str, Any]]:
-        """从xhs_note表获取指定note_id的笔记详情"""
+    def get_note_details_by_ids(self, note_ids: List[str], columns: str = "*") -> List[Dict[str, Any]]:
+        """从xhs_note表获取指定note_id的笔记详情
+        
+        note_id按NOTE_ID_CHUNK_SIZE分块，多个IN查询通过线程池并发执行后合并结果
+        
+        Args:
+            note_ids: 笔记ID列表
+            columns: 需要返回的列（逗号分隔），默认返回全部列
+        """
         if not self.client:
             logger.error("数据库客户端未初始化")
             return []
@@ -209,19 +411,32 @@ class SupabaseDatabase:
         if not note_ids:
             return []
         
+        chunks = [
+            note_ids[i:i + NOTE_ID_CHUNK_SIZE]
+            for i in range(0, len(note_ids), NOTE_ID_CHUNK_SIZE)
+        ]
+        
         try:
-            # Supabase的in操作
-            response = (
-                self.client.table("xhs_note")
-                .select("*")
-                .in_("note_id", note_ids)
-                .execute()
-            )
-            return response.data
+            if len(chunks) == 1:
+                return self._fetch_note_chunk(chunks[0], columns)
+            
+            with ThreadPoolExecutor(max_workers=min(NOTE_FETCH_MAX_WORKERS, len(chunks))) as executor:
+                chunk_results = executor.map(lambda chunk: self._fetch_note_chunk(chunk, columns), chunks)
+                return [note for chunk_data in chunk_results for note in chunk_data]
         except Exception as e:
             logger.error(f"获取笔记详情失败: {e}")
             return []
     
+    def _fetch_note_chunk(self, note_ids: List[str], columns: str = "*") -> List[Dict[str, Any]]:
+        """单个分块的笔记详情查询（Supabase的in操作）"""
+        response = (
+            self.client.table("xhs_note")
+            .select(columns)
+            .in_("note_id", note_ids)
+            .execute()
+        )
+        return response.data
+    
     # ==================== SOV数据库操作 ====================
     
     def get_sov_data_by_keyword(self, keyword: str, tier_limit: Optional[int] = None) -> List[Dict]:
@@ -249,27 +464,36 @@ class SupabaseDatabase:
     
     def batch_insert_sov_data(self, data_to_insert: List[Dict]) -> Dict[str, Any]:
         """批量插入SOV数据到数据库"""
+        return self._batch_insert("xhs_keyword_sov_result", data_to_insert, "SOV数据")
+    
+    def _batch_insert(self, table: str, data_to_insert: List[Dict], label: str) -> Dict[str, Any]:
+        """
+        按INSERT_CHUNK_SIZE分块插入数据，服务端不回传插入的行
+        
+        中途失败时之前的分块已写入，返回结果中的inserted_count为已写入的条数
+        """
         if not self.client:
             return {"success": False, "error": "数据库客户端未初始化"}
             
         if not data_to_insert:
             return {"success": False, "error": "没有数据需要插入"}
         
+        inserted_count = 0
         try:
-            response = (
-                self.client.table("xhs_keyword_sov_result")
-                .insert(data_to_insert)
-                .execute()
-            )
-            
-            if response.data:
-                return {"success": True, "inserted_count": len(response.data)}
-            else:
-                return {"success": True, "inserted_count": len(data_to_insert)}
+            for start in range(0, len(data_to_insert), INSERT_CHUNK_SIZE):
+                chunk = data_to_insert[start:start + INSERT_CHUNK_SIZE]
+                (
+                    self.client.table(table)
+                    .insert(chunk, returning=ReturnMethod.minimal)
+                    .execute()
+                )
+                inserted_count += len(chunk)
+            
+            return {"success": True, "inserted_count": inserted_count}
                 
         except Exception as e:
-            logger.error(f"批量插入SOV数据失败: {e}")
-            return {"success": False, "error": str(e)}
+            logger.error(f"批量插入{label}失败: {e}")
+            return {"success": False, "error": str(e), "inserted_count": inserted_count}
     
     # ==================== 情感分析数据库操作 ====================
     
@@ -298,34 +522,26 @@ class SupabaseDatabase:
     
     def batch_insert_sentiment_data(self, data_to_insert: List[Dict]) -> Dict[str, Any]:
         """批量插入情感分析数据到数据库"""
-        if not self.client:
-            return {"success": False, "error": "数据库客户端未初始化"}
-            
-        if not data_to_insert:
-            return {"success": False, "error": "没有数据需要插入"}
-        
-        try:
-            response = (
-                self.client.table("xhs_keyword_brand_rank_sentiment_result")
-                .insert(data_to_insert)
-                .execute()
-            )
-            
-            if response.data:
-                return {"success": True, "inserted_count": len(response.data)}
-            else:
-                return {"success": True, "inserted_count": len(data_to_insert)}
-                
-        except Exception as e:
-            logger.error(f"批量插入情感分析数据失败: {e}")
-            return {"success": False, "error": str(e)}
+        return self._batch_insert("xhs_keyword_brand_rank_sentiment_result", data_to_insert, "情感分析数据")
     
     # ==================== 通用数据处理方法 ====================
     
+    @staticmethod
+    def _is_missing(value) -> bool:
+        """判断标量是否为空值（None/NaN/pd.NA/NaT），避免逐字段调用pd.isna"""
+        if value is None or value is pd.NA or value is pd.NaT:
+            return True
+        # float与numpy浮点（含float32）的NaN不等于自身；numpy的NaT需用isnat判断
+        if isinstance(value, (float, np.floating)):
+            return bool(value != value)
+        if isinstance(value, (np.datetime64, np.timedelta64)):
+            return bool(np.isnat(value))
+        return False
+    
     def safe_int(self, value, default=0):
         """安全转换为整数"""
         try:
-            if pd.isna(value) or value == '' or value is None:
+            if self._is_missing(value) or value == '':
                 return default
             return int(float(value))
         except (ValueError, TypeError):
@@ -334,7 +550,7 @@ class SupabaseDatabase:
     def safe_float(self, value, default=0.0):
         """安全转换为浮点数"""
         try:
-            if pd.isna(value) or value == '' or value is None:
+            if self._is_missing(value) or value == '':
                 return default
             return float(value)
         except (ValueError, TypeError):
@@ -343,7 +559,7 @@ class SupabaseDatabase:
     def safe_str(self, value, default=""):
         """安全转换为字符串"""
         try:
-            if pd.isna(value) or value is None:
+            if self._is_missing(value):
                 return default
             return str(value)
         except (ValueError, TypeError):
@@ -402,10 +618,12 @@ class SupabaseDatabase:
 
     # ==================== 应用层工具方法（取代database_service_tools.py） ====================
     
-    def get_unprocessed_notes_json(self, batch_size: str = "10") -> str:
+    def get_unprocessed_notes_json(self, batch_size: str = "10", after_id: int = 0) -> str:
         """
         读取未处理的笔记数据（JSON格式输出）
         取代 DatabaseReaderTool._run()
+        
+        返回结果中的last_id可作为下一次调用的after_id
         """
         try:
             # 处理batch_size参数
@@ -416,22 +634,23 @@ class SupabaseDatabase:
             
             logger.info(f"[Database] 准备读取 {limit} 条未处理的笔记数据")
             
-            notes = self.get_unprocessed_notes(limit)
+            notes = self.get_unprocessed_notes(limit, after_id)
             
             if not notes:
-                return json.dumps({"error": "没有找到未处理的笔记数据"}, ensure_ascii=False)
+                return _json_dumps({"error": "没有找到未处理的笔记数据"})
             
             result = {
                 "total_count": len(notes),
                 "requested_limit": limit,
+                "last_id": max(note.get("id") or 0 for note in notes),
                 "notes": notes
             }
 
-            return json.dumps(result, ensure_ascii=False)
+            return _json_dumps(result)
             
         except Exception as e:
             logger.error(f"读取数据失败: {e}")
-            return json.dumps({"error": f"读取数据失败: {str(e)}"}, ensure_ascii=False)
+            return _json_dumps({"error": f"读取数据失败: {str(e)}"})
     
     def update_single_note_analysis_json(self, result_dict: Dict) -> str:
         """
@@ -443,25 +662,25 @@ class SupabaseDatabase:
             
             note_id = result_dict.get('note_id')
             if not note_id:
-                return json.dumps({"success": False, "message": "❌ 缺少note_id字段"}, ensure_ascii=False)
+                return _json_dumps({"success": False, "message": "❌ 缺少note_id字段"})
             
             success = self.update_analysis_result(note_id, result_dict)
             
             if success:
-                logger.info(f"[Database] ✅ 成功写入笔记分析结果: {note_id}")
-                return json.dumps({
+                logger.info("[Database] ✅ 成功写入笔记分析结果: %s", note_id)
+                return _json_dumps({
                     "success": True, 
                     "message": f"✅ 成功写入笔记分析结果: {note_id}"
-                }, ensure_ascii=False)
+                })
             else:
                 error_msg = "数据库写入失败"
                 logger.error(f"[Database] ❌ {error_msg}")
-                return json.dumps({"success": False, "message": f"❌ {error_msg}"}, ensure_ascii=False)
+                return _json_dumps({"success": False, "message": f"❌ {error_msg}"})
                 
         except Exception as e:
             error_msg = f"写入异常: {str(e)}"
             logger.error(f"[Database] ❌ {error_msg}")
-            return json.dumps({"success": False, "message": f"❌ {error_msg}"}, ensure_ascii=False)
+            return _json_dumps({"success": False, "message": f"❌ {error_msg}"})
     
     def get_specific_notes_json(self, note_ids: List[str]) -> str:
         """
@@ -474,7 +693,7 @@ class SupabaseDatabase:
             notes = self.get_unprocessed_notes_by_ids(note_ids)
             
             if not notes:
-                return json.dumps({"error": "没有找到指定的笔记数据"}, ensure_ascii=False)
+                return _json_dumps({"error": "没有找到指定的笔记数据"})
             
             result = {
                 "total_count": len(notes),
@@ -482,8 +701,19 @@ class SupabaseDatabase:
                 "notes": notes
             }
 
-            return json.dumps(result, ensure_ascii=False)
+            return _json_dumps(result)
             
         except Exception as e:
             logger.error(f"读取特定笔记数据失败: {e}")
-            return json.dumps({"error": f"读取特定笔记数据失败: {str(e)}"}, ensure_ascii=False) 
\ No newline at end of file
+            return _json_dumps({"error": f"读取特定笔记数据失败: {str(e)}"}) 
+
+
+# 全局数据库实例（各工具共用同一个客户端和HTTP连接池）
+_global_database = None
+
+def get_database() -> SupabaseDatabase:
+    """获取全局数据库实例"""
+    global _global_database
+    if _global_database is None:
+        _global_database = SupabaseDatabase()
+    return _global_database
@@ -8,6 +8,7 @@ Provides a clean interface for all file I/O operations used across the applicati
 import os
 import json
 import glob
+import orjson
 import logging
 from typing import Any, Dict, List, Optional, Union
 from pathlib import Path
@@ -30,13 +31,19 @@ class CSVManager:
         Args:
             file_path: CSV文件路径
             encoding: 文件编码，默认utf-8-sig
-            **kwargs: pandas.read_csv的其他参数
+            **kwargs: pandas.read_csv的其他参数（engine='pyarrow'时若pyarrow不可用或解析失败，回退到默认引擎）
             
         Returns:
             DataFrame对象
         """
         try:
             logger.info(f"读取CSV文件: {file_path}")
+            if kwargs.get('engine') == 'pyarrow':
+                try:
+                    return pd.read_csv(file_path, encoding=encoding, **kwargs)
+                except Exception as e:
+                    logger.warning(f"pyarrow读取CSV失败，回退到默认引擎 {file_path}: {e}")
+                    kwargs.pop('engine')
             return pd.read_csv(file_path, encoding=encoding, **kwargs)
         except Exception as e:
             logger.error(f"读取CSV文件失败 {file_path}: {e}")
@@ -44,7 +51,7 @@ class CSVManager:
     
     @staticmethod
     def write_csv(df: pd.DataFrame, file_path: str, encoding: str = 'utf-8-sig', 
-                  index: bool = False, ensure_dir: bool = True, **kwargs) -> str:
+                  index: bool = False, ensure_dir: bool = True, engine: str = 'pandas', **kwargs) -> str:
         """
         写入CSV文件
         
@@ -54,6 +61,7 @@ class CSVManager:
             encoding: 文件编码，默认utf-8-sig
             index: 是否包含索引，默认False
             ensure_dir: 是否确保目录存在，默认True
+            engine: 写入引擎，'pandas'或'pyarrow'（pyarrow不可用或写入失败时回退到pandas）
             **kwargs: pandas.to_csv的其他参数
             
         Returns:
@@ -64,12 +72,61 @@ class CSVManager:
                 DirectoryManager.ensure_directory(os.path.dirname(file_path))
                 
             logger.info(f"写入CSV文件: {file_path}")
-            df.to_csv(file_path, encoding=encoding, index=index, **kwargs)
+            if engine == 'pyarrow' and not index and CSVManager._write_csv_arrow(
+                df, file_path, encoding, kwargs.get('columns'), kwargs.get('header', True)
+            ):
+                return file_path
+            
+            # 通过1MB缓冲的文件句柄写出，减少小块写入的系统调用
+            kwargs.setdefault('lineterminator', '\n')
+            with open(file_path, kwargs.pop('mode', 'w'), encoding=encoding, newline='', buffering=1 << 20) as f:
+                df.to_csv(f, index=index, **kwargs)
             return file_path
         except Exception as e:
             logger.error(f"写入CSV文件失败 {file_path}: {e}")
             raise
     
+    @staticmethod
+    def _write_csv_arrow(df: pd.DataFrame, file_path: str, encoding: str,
+                         columns: Optional[List[str]] = None, header: Union[bool, List[str]] = True) -> bool:
+        """
+        使用Arrow的多线程C++ CSV写入器输出（仅支持UTF-8系编码）
+        
+        注意：Arrow会给所有字符串字段和表头加引号，适合程序读取的内部文件，对外文件应使用pandas输出
+        
+        Args:
+            columns: 只写出的列（与to_csv的columns一致），默认全部列
+            header: True写出原列名，False不写表头，列表则作为替换的表头
+        
+        Returns:
+            是否写入成功；返回False时由调用方回退到pandas
+        """
+        if encoding.lower().replace('_', '-') not in ('utf-8', 'utf-8-sig', 'utf8'):
+            return False
+        try:
+            import pyarrow as pa
+            import pyarrow.csv as pacsv
+        except ImportError:
+            return False
+        
+        try:
+            # 布尔值按to_csv的格式写成True/False（Arrow默认输出小写true/false）
+            bool_columns = [col for col in (columns or df.columns) if pd.api.types.is_bool_dtype(df[col])]
+            if bool_columns:
+                df = df.assign(**{col: df[col].map({True: 'True', False: 'False'}) for col in bool_columns})
+            table = pa.Table.from_pandas(df, columns=columns, preserve_index=False)
+            if isinstance(header, (list, tuple)):
+                table = table.rename_columns(list(header))
+            with open(file_path, 'wb') as f:
+                # Arrow只输出UTF-8，utf-8-sig所需的BOM手动写入
+                if encoding.lower().replace('_', '-') == 'utf-8-sig':
+                    f.write('\ufeff'.encode('utf-8'))
+                pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(include_header=header is not False))
+            return True
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logger.warning(f"Arrow写入CSV失败，回退到pandas {file_path}: {e}")
+            return False
+    
     @staticmethod
     def find_latest_csv(pattern: str) -> Optional[str]:
         """
@@ -109,6 +166,10 @@ class JSONManager:
             # 确保目录存在
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
             
+            if not ensure_ascii and indent in (None, 2) and self._write_json_orjson(data, file_path, indent):
+                logger.info(f"JSON文件保存成功: {file_path}")
+                return file_path
+            
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=ensure_ascii, indent=indent)
             
@@ -118,12 +179,26 @@ class JSONManager:
             logger.error(f"保存JSON文件失败 {file_path}: {e}")
             raise
     
+    @staticmethod
+    def _write_json_orjson(data: Any, file_path: str, indent: Optional[int]) -> bool:
+        """用orjson写入JSON文件（支持numpy数值和非字符串键），遇到不支持的类型返回False由调用方回退到json"""
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            content = orjson.dumps(data, option=option)
+        except TypeError:
+            return False
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        return True
+    
     def parse_json_string(self, json_str: str) -> Any:
         """解析JSON字符串"""
         try:
             if not json_str or json_str.strip() == "":
                 return None
-            return json.loads(json_str)
+            return orjson.loads(json_str)
         except json.JSONDecodeError as e:
             logger.warning(f"JSON字符串解析失败: {json_str[:100]}... - {e}")
             return None
@@ -134,6 +209,12 @@ class JSONManager:
     def to_json_string(self, data: Any, ensure_ascii: bool = False) -> str:
         """转换为JSON字符串"""
         try:
+            if not ensure_ascii:
+                try:
+                    return orjson.dumps(data).decode('utf-8')
+                except TypeError:
+                    # orjson不支持的类型（如非字符串键）回退到标准库
+                    pass
             return json.dumps(data, ensure_ascii=ensure_ascii)
         except Exception as e:
             logger.error(f"数据转JSON字符串失败: {e}")
@@ -254,6 +335,33 @@ class DirectoryManager:
             logger.error(f"查找文件失败 {pattern}: {e}")
             raise
     
+    @staticmethod
+    def find_latest_file(dir_path: str, prefix: str = "", suffix: str = "") -> Optional[str]:
+        """
+        在目录中查找名称匹配前后缀的最新文件（按创建时间）
+        
+        单次os.scandir遍历目录，每个候选文件只stat一次
+        
+        Args:
+            dir_path: 目录路径
+            prefix: 文件名前缀
+            suffix: 文件名后缀
+            
+        Returns:
+            最新文件的路径，目录不存在或没有匹配文件时返回None
+        """
+        try:
+            with os.scandir(dir_path) as entries:
+                latest = max(
+                    (entry for entry in entries
+                     if entry.name.startswith(prefix) and entry.name.endswith(suffix) and entry.is_file()),
+                    key=lambda entry: entry.stat().st_ctime,
+                    default=None,
+                )
+        except FileNotFoundError:
+            return None
+        return latest.path if latest else None
+    
     @staticmethod
     def get_output_path(base_dir: str, filename: str, extension: str = None) -> str:
         """
@@ -380,6 +488,10 @@ class FileManager:
             return None
         return max(files, key=os.path.getctime)
     
+    def find_latest_file_in_dir(self, dir_path: str, prefix: str = "", suffix: str = "") -> Optional[str]:
+        """在目录中找到名称匹配前后缀的最新文件"""
+        return self.directory.find_latest_file(dir_path, prefix, suffix)
+    
     def parse_json_string(self, json_str: str) -> Any:
         """解析JSON字符串"""
         return self.json.parse_json_string(json_str)
@@ -408,6 +520,22 @@ class FileManager:
         """保存CSV文件"""
         return self.csv.write_csv(df, file_path, **kwargs)
     
+    def read_parquet(self, file_path: str) -> pd.DataFrame:
+        """读取Parquet文件（依赖pyarrow，未安装时抛出ImportError）"""
+        logger.info(f"读取Parquet文件: {file_path}")
+        return pd.read_parquet(file_path, engine='pyarrow')
+    
+    def save_parquet(self, df: pd.DataFrame, file_path: str, compression: str = 'zstd') -> str:
+        """保存Parquet文件（依赖pyarrow，未安装时抛出ImportError）"""
+        try:
+            self.directory.ensure_directory(os.path.dirname(file_path))
+            logger.info(f"写入Parquet文件: {file_path}")
+            df.to_parquet(file_path, engine='pyarrow', compression=compression, index=False)
+            return file_path
+        except Exception as e:
+            logger.error(f"写入Parquet文件失败 {file_path}: {e}")
+            raise
+    
     def save_json(self, data: Dict[str, Any], file_path: str, **kwargs) -> str:
         """保存JSON文件"""
         return self.json.write_json(data, file_path, **kwargs)
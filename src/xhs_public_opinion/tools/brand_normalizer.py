@@ -1,6 +1,7 @@
 import re
 import json
-from typing import Dict, List, Optional
+import functools
+from typing import Dict, Iterable, List, Optional
 from difflib import SequenceMatcher
 import logging
 
@@ -52,10 +53,13 @@ class BrandNormalizer:
         # 预编译正则表达式
         self.cleanup_pattern = re.compile(r'[^\w\s&\'-]', re.UNICODE)
         self.space_pattern = re.compile(r'\s+')
+        
+        # 标准化结果缓存（映射表变更时清空）
+        self._cached_normalize = functools.lru_cache(maxsize=4096)(self._normalize_uncached)
     
     def normalize_brand_name(self, brand_name: str) -> str:
         """
-        标准化品牌名
+        标准化品牌名（结果按原始品牌名缓存）
         
         Args:
             brand_name: 原始品牌名
@@ -66,6 +70,14 @@ class BrandNormalizer:
         if not brand_name or not isinstance(brand_name, str):
             return ""
         
+        return self._cached_normalize(brand_name)
+    
+    def clear_cache(self):
+        """清空标准化结果缓存"""
+        self._cached_normalize.cache_clear()
+    
+    def _normalize_uncached(self, brand_name: str) -> str:
+        """执行完整的标准化流程"""
         # 1. 基础清理
         normalized = self._basic_cleanup(brand_name)
         
@@ -159,10 +171,29 @@ class BrandNormalizer:
         
         return normalized_brands
     
+    def build_lookup_table(self, brand_names: Iterable[str]) -> Dict[str, str]:
+        """
+        批量构建品牌名查找表
+        
+        对去重后的品牌名各执行一次标准化，调用方之后通过字典查找代替重复标准化
+        
+        Args:
+            brand_names: 原始品牌名（可包含重复；传入set时不再重复去重）
+            
+        Returns:
+            原始品牌名 -> 标准化品牌名 的映射
+        """
+        return {
+            brand: self.normalize_brand_name(brand)
+            for brand in (brand_names if isinstance(brand_names, (set, frozenset)) else set(brand_names))
+            if brand and isinstance(brand, str)
+        }
+    
     def add_brand_mapping(self, variants: List[str], standard_name: str):
         """添加品牌映射"""
         for variant in variants:
             self.brand_mapping[variant.lower()] = standard_name
+        self.clear_cache()
     
     def get_mapping_stats(self) -> Dict[str, int]:
         """获取映射统计信息"""
@@ -182,6 +213,7 @@ class BrandNormalizer:
             with open(filepath, 'r', encoding='utf-8') as f:
                 loaded_mapping = json.load(f)
                 self.brand_mapping.update(loaded_mapping)
+                self.clear_cache()
                 logger.info(f"已加载品牌映射表: {filepath}")
         except FileNotFoundError:
             logger.warning(f"品牌映射表文件不存在: {filepath}")
@@ -7,7 +7,7 @@ import logging
 from datetime import datetime
 from .brand_normalizer import get_brand_normalizer
 from .brand_normalizer import BrandNormalizer
-from ..store import SupabaseDatabase, FileManager
+from ..store import get_database, FileManager
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +19,7 @@ class BrandSentimentExtractorTool:
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # 初始化数据库和文件管理器
-        self.db = SupabaseDatabase()
+        self.db = get_database()
         self.file_manager = FileManager()
         
         # 初始化品牌标准化器
@@ -336,16 +336,12 @@ class BrandSentimentExtractorTool:
         self.file_manager.ensure_directory(output_dir)
         output_path = self.file_manager.build_path(output_dir, output_filename)
         
-        # 创建DataFrame
-        df = pd.DataFrame(processed_data)
-
-        # 筛选column_mapping中存在的列并重命名为中文
-        available_columns = [col for col in self.column_mapping.keys() if col in df.columns]
-        df_copy = df[available_columns].copy()
-        df_copy.rename(columns=self.column_mapping, inplace=True)
+        # 按column_mapping的列直接构建DataFrame（跳过列推断与筛选），并重命名为中文
+        df = pd.DataFrame.from_records(processed_data, columns=list(self.column_mapping.keys()))
+        df.rename(columns=self.column_mapping, inplace=True)
         
         # 输出到CSV
-        self.file_manager.save_csv(df_copy, output_path)
+        self.file_manager.save_csv(df, output_path)
         
         logger.info(f"[BrandSentimentExtractor] CSV文件已保存: {output_path}")
         return output_path
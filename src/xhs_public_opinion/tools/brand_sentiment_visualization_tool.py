@@ -11,7 +11,7 @@ import matplotlib.patches as mpatches
 import warnings
 import matplotlib.font_manager as fm
 
-from ..store import SupabaseDatabase, FileManager
+from ..store import get_database, FileManager
 
 # 设置中文字体和样式
 def setup_chinese_fonts():
@@ -65,7 +65,7 @@ class BrandSentimentVisualizationTool:
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # 初始化数据库连接和文件管理器
-        self.db = SupabaseDatabase()
+        self.db = get_database()
         self.file_manager = FileManager()
     
     def _run(self, keyword: str, target_brand: str, output_dir: str = "outputs") -> str:
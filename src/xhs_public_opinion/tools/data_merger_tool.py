@@ -1,19 +1,78 @@
-import os
 import json
+import orjson
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Optional
-from crewai.tools import BaseTool
+from typing import List, Dict, Any, Iterable, Literal, Optional
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pydantic import BaseModel, Field
 
-from .brand_normalizer import BrandNormalizer, get_brand_normalizer
-from ..store import SupabaseDatabase, FileManager
+from .brand_normalizer import get_brand_normalizer
+from ..store import get_database, FileManager
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 拼接宽表的固定列顺序（与_merge_data_with_rankings构建的记录字段一致）
+MERGED_COLUMNS = [
+    'search_id', 'keyword', 'rank', 'rrf_score', 'account_ranks', 'note_id',
+    'title', 'type', 'desc', 'note_url', 'video_url', 'image_list', 'tag_list',
+    'author_id', 'nickname', 'last_update_time',
+    'liked_count', 'collected_count', 'comment_count', 'share_count',
+    'brand_list', 'spu_list', 'emotion_dict', 'evaluation_dict',
+    'has_note_detail', 'has_brand_info', 'data_crawler_time',
+]
+
+# 排序结果表的列（每个note_id一行）
+RANKING_COLUMNS = ['note_id', 'search_id', 'rank', 'rrf_score', 'account_ranks', 'data_crawler_time']
+
+# 笔记详情表参与拼接的列（品牌相关字段为标准化后的值）
+NOTE_COLUMNS = [
+    'note_id', 'title', 'type', 'desc', 'note_url', 'video_url', 'image_list', 'tag_list',
+    'author_id', 'nickname', 'last_update_time',
+    'liked_count', 'collected_count', 'comment_count', 'share_count',
+    'brand_list', 'spu_list', 'emotion_dict', 'evaluation_dict',
+]
+
+# 数据库查询只取拼接用到的列，避免取回未使用的宽字段
+SEARCH_RESULT_SELECT = 'id,note_id,search_account,rank,created_at'
+NOTE_SELECT = ','.join(NOTE_COLUMNS)
+
+# 品牌相关的JSON字段（获取笔记详情后统一解析一次）
+BRAND_JSON_FIELDS = ('brand_list', 'emotion_dict', 'evaluation_dict')
+
+# 需要序列化为JSON字符串的列
+JSON_COLUMNS = ['image_list', 'tag_list', 'brand_list', 'spu_list', 'emotion_dict', 'evaluation_dict']
+
+# 显式列类型，计数列无法转换时（如"1万+"）保持原样
+MERGED_DTYPES = {
+    'rank': 'Int32',
+    'liked_count': 'Int32',
+    'collected_count': 'Int32',
+    'comment_count': 'Int32',
+    'share_count': 'Int32',
+    'type': 'category',
+}
+
+# CSV分块写出的行数
+CSV_CHUNK_SIZE = 10_000
+
+def _to_json_cell(value: Any) -> str:
+    """将JSON字段的单元格转换为字符串（空值、NaN输出为空字符串）"""
+    if isinstance(value, float) or not value:
+        return ''
+    try:
+        return orjson.dumps(value).decode('utf-8')
+    except TypeError:
+        return json.dumps(value, ensure_ascii=False)
+
+def _stringify_mixed_columns(df: pd.DataFrame):
+    """无法转换为整数的计数列（如"1万+"与数字混杂）就地转为字符串类型，使Arrow能够写出"""
+    for col in MERGED_DTYPES:
+        if df[col].dtype == object:
+            df[col] = df[col].astype('string')
+
 class DataMergerTool:
     """数据拼接工具 - 将搜索结果表和笔记详情表连接生成宽表"""
     name: str = "data_merger"
@@ -22,11 +81,9 @@ class DataMergerTool:
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         
-        # 初始化品牌标准化器
-        self.brand_normalizer = get_brand_normalizer()
-        
-        # 初始化数据库连接
-        self.db = SupabaseDatabase()
+        # 品牌标准化器和数据库连接在首次使用时才初始化（工具实例化时不加载映射表、不建立连接）
+        self._brand_normalizer = None
+        self._db = None
         self.file_manager = FileManager()
         
         # 中英文列名映射
@@ -52,15 +109,43 @@ class DataMergerTool:
         "data_crawler_time": "数据采集时间",
     }
         
+        # 对外CSV的列及中文表头只需生成一次，每次导出直接复用
+        self._outer_columns = list(self.column_mapping.keys())
+        self._outer_headers = list(self.column_mapping.values())
+        
         logger.info(f"[DataMergerTool] 使用RRF倒数排名融合算法进行多账户排名合并")
     
-    def _run(self, keyword: str, output_dir_inner: str = "data/export",  output_dir_outer: str = "outputs") -> str:
+    @property
+    def brand_normalizer(self):
+        """品牌标准化器（延迟初始化）"""
+        return self._ensure_brand_normalizer()
+    
+    def _ensure_brand_normalizer(self):
+        """确保品牌标准化器已初始化（首次调用时加载映射表）并返回"""
+        if self._brand_normalizer is None:
+            self._brand_normalizer = get_brand_normalizer()
+        return self._brand_normalizer
+    
+    @property
+    def db(self):
+        """数据库连接（延迟初始化）"""
+        if self._db is None:
+            self._db = get_database()
+        return self._db
+    
+    def _run(self, keyword: str, output_dir_inner: str = "data/export",  output_dir_outer: str = "outputs",
+             require_note_details: bool = False, output_format: Literal["csv", "parquet"] = "csv",
+             use_cache: bool = False) -> str:
         """
         执行数据拼接任务
         
         Args:
             keyword: 要查询的关键词
             output_dir: 输出目录，默认为data/export
+            require_note_details: 是否只保留在xhs_note表中有详情的笔记（丢弃未匹配记录并重新编排名次）
+            output_format: 内部数据文件格式，csv（默认）或parquet（在CSV之外额外保存一份Parquet，下游SOV/舆情工具仍读取CSV）
+            use_cache: 是否使用并写入当天已拼接的Parquet缓存（命中时跳过数据库查询和拼接）。默认关闭：
+                       缓存不感知之后的品牌分析回写或重新采集，只有确认当天数据不会再变化时才开启
             
         Returns:
             返回操作结果信息
@@ -68,38 +153,79 @@ class DataMergerTool:
         try:
             logger.info(f"[DataMergerTool] 开始为关键词 '{keyword}' 进行数据拼接")
             
-            # 1. 从xhs_search_result表获取指定关键词的搜索结果
-            search_results = self._get_search_results(keyword)
-            if not search_results:
-                return f"关键词 '{keyword}' 没有找到搜索结果数据"
-            
-            logger.info(f"[DataMergerTool] 获取到 {len(search_results)} 条搜索结果")
-            
-            # 2. 合并多账户排序结果
-            merged_rankings = self._merge_multi_account_rankings(search_results)
+            # 0. 当天已拼接过的关键词直接读取缓存的前100名数据
+            cache_path = self._get_cache_path(keyword, output_dir_inner, require_note_details)
+            if use_cache:
+                cached_data = self._load_merged_cache(cache_path)
+                if cached_data is not None:
+                    csv_path = self._save_to_csv(cached_data, keyword, output_dir_inner, output_dir_outer, output_format)
+                    logger.info(f"[DataMergerTool] 使用缓存 {cache_path}（{len(cached_data)}条），文件已保存到: {csv_path}")
+                    return csv_path
+            
+            # 1-2. 优先由数据库直接计算RRF排名（只取回聚合后的排名），不可用时取回搜索结果在本地合并
+            note_details = None
+            # 丢弃未匹配笔记时需要完整排名来补足名次，其余情况只需前100名
+            rrf_rows = self.db.get_rrf_rankings_by_keyword(keyword, top_n=None if require_note_details else 100)
+            if rrf_rows is not None:
+                search_results = rrf_rows
+                if not search_results:
+                    return f"关键词 '{keyword}' 没有找到搜索结果数据"
+                merged_rankings = self._rankings_from_rrf_rows(rrf_rows)
+            else:
+                # 1. 从xhs_search_result表获取指定关键词的搜索结果（优先通过服务端JOIN同时取回笔记详情）
+                prefetched = self.db.get_search_results_with_notes_by_keyword(keyword)
+                if prefetched is not None:
+                    search_results, note_details = prefetched
+                else:
+                    search_results = self._get_search_results(keyword)
+                if not search_results:
+                    return f"关键词 '{keyword}' 没有找到搜索结果数据"
+                
+                logger.info(f"[DataMergerTool] 获取到 {len(search_results)} 条搜索结果")
+                
+                # 2. 合并多账户排序结果
+                merged_rankings = self._merge_multi_account_rankings(search_results)
+            if merged_rankings.empty:
+                return f"关键词 '{keyword}' 的搜索结果中没有有效的排名数据"
             logger.info(f"[DataMergerTool] 合并后得到 {len(merged_rankings)} 个唯一note_id的排序")
             
             # 3. 提取所有note_id
-            note_ids = list(merged_rankings.keys())
+            note_ids = merged_rankings.index.tolist()
             
             logger.info(f"[DataMergerTool] 提取到 {len(note_ids)} 个唯一的note_id")
             
-            # 4. 从xhs_note表获取对应的笔记详情
-            note_details = self._get_note_details(note_ids)
+            # 4. 从xhs_note表获取对应的笔记详情（服务端JOIN已取回时跳过）
+            # 网络查询放到后台线程，等待期间完成品牌标准化器的初始化（加载映射表）
+            if note_details is None:
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    details_future = executor.submit(self._get_note_details, note_ids)
+                    self._ensure_brand_normalizer()
+                    note_details = details_future.result()
             
             logger.info(f"[DataMergerTool] 获取到 {len(note_details)} 条笔记详情")
             
-            # 5. 数据拼接（使用合并后的排序结果）
+            # 品牌相关JSON字段统一解析一次，标准化和品牌信息判断直接使用解析结果
+            self._parse_brand_fields(note_details)
+            
+            if require_note_details:
+                merged_rankings = self._drop_unmatched_rankings(merged_rankings, note_details)
+                logger.info(f"[DataMergerTool] 仅保留有笔记详情的记录: {len(merged_rankings)} 个")
+            
+            # 5. 数据拼接（使用合并后的排序结果，输出已按rank排列）
             merged_data = self._merge_data_with_rankings(merged_rankings, note_details, keyword)
             
-            # 6. 生成CSV文件（只保存前100名）
-            csv_path = self._save_to_csv(merged_data, keyword, output_dir_inner, output_dir_outer)
+            # 只取前100名，CSV输出和统计共用
+            top_100_data = merged_data.head(100)
+            logger.info(f"[DataMergerTool] 原始数据{len(merged_data)}条，筛选前100名后为{len(top_100_data)}条")
+            
+            if use_cache:
+                self._save_merged_cache(top_100_data, cache_path)
+            
+            # 6. 生成CSV文件
+            csv_path = self._save_to_csv(top_100_data, keyword, output_dir_inner, output_dir_outer, output_format)
             
             # 7. 生成统计报告（基于前100名数据）
-            # 按rank排序并只取前100名用于统计
-            sorted_data = sorted(merged_data, key=lambda x: x.get('rank', float('inf')))
-            top_100_data = sorted_data[:100]
-            stats = self._generate_statistics(top_100_data, keyword)
+            stats = self._generate_statistics(top_100_data, merged_rankings, keyword)
             logger.info(f"""✅ 数据拼接完成！
 
 📊 统计信息:
@@ -126,15 +252,48 @@ class DataMergerTool:
             logger.error(f"[DataMergerTool] 数据拼接失败: {e}")
             return f"数据拼接失败: {str(e)}"
     
+    def _get_cache_path(self, keyword: str, output_dir_inner: str, require_note_details: bool) -> str:
+        """拼接结果缓存路径，按关键词、日期及是否只保留有详情的笔记区分"""
+        timestamp = datetime.now().strftime("%Y%m%d")
+        suffix = "_matched" if require_note_details else ""
+        return self.file_manager.build_path(output_dir_inner, keyword, f"merged_cache_{timestamp}{suffix}.parquet")
+    
+    def _load_merged_cache(self, cache_path: str) -> Optional[pd.DataFrame]:
+        """读取拼接结果缓存，JSON字段还原为Python对象；缓存不存在或不可读时返回None"""
+        if not self.file_manager.file_exists(cache_path):
+            return None
+        
+        try:
+            cached_data = self.file_manager.read_parquet(cache_path)
+        except Exception as e:
+            logger.warning(f"[DataMergerTool] 读取缓存失败，重新拼接: {e}")
+            return None
+        
+        for col in JSON_COLUMNS:
+            cached_data[col] = [self._parse_json_field(value) for value in cached_data[col].to_numpy()]
+        return cached_data
+    
+    def _save_merged_cache(self, data: pd.DataFrame, cache_path: str):
+        """将拼接结果（JSON字段序列化为字符串）缓存为Parquet，写入失败不影响主流程"""
+        cache_df = data.astype(MERGED_DTYPES, errors='ignore')
+        for col in JSON_COLUMNS:
+            cache_df[col] = [_to_json_cell(value) for value in cache_df[col].to_numpy()]
+        _stringify_mixed_columns(cache_df)
+        
+        try:
+            self.file_manager.save_parquet(cache_df, cache_path)
+        except Exception as e:
+            logger.warning(f"[DataMergerTool] 缓存写入失败，跳过: {e}")
+    
     def _get_search_results(self, keyword: str) -> List[Dict[str, Any]]:
         """从xhs_search_result表获取指定关键词的搜索结果"""
-        return self.db.get_search_results_by_keyword(keyword)
+        return self.db.get_search_results_by_keyword(keyword, columns=SEARCH_RESULT_SELECT)
     
     def _get_note_details(self, note_ids: List[str]) -> List[Dict[str, Any]]:
         """从xhs_note表获取指定note_id的笔记详情"""
-        return self.db.get_note_details_by_ids(note_ids)
+        return self.db.get_note_details_by_ids(note_ids, columns=NOTE_SELECT)
     
-    def _merge_multi_account_rankings(self, search_results: List[Dict]) -> Dict[str, Dict]:
+    def _merge_multi_account_rankings(self, search_results: List[Dict]) -> pd.DataFrame:
         """
         合并多账户的排序结果（使用RRF算法）
         
@@ -142,82 +301,117 @@ class DataMergerTool:
             search_results: 原始搜索结果列表
             
         Returns:
-            Dict[note_id, {rrf_score, final_rank, account_ranks, account_list}]
+            以note_id为索引、按最终排名排列的DataFrame，列为RANKING_COLUMNS中除note_id外的字段，
+            另含account_coverage（每个note_id有排名的账户数，用于统计）
         """
-        # 按note_id分组，收集各账户的排名
-        note_rankings = {}
-        all_accounts = set()
-        
-        for result in search_results:
-            note_id = result.get('note_id')
-            account = result.get('search_account')
-            rank = result.get('rank')
-            
-            if not note_id or not account or rank is None:
-                continue
-                
-            all_accounts.add(account)
-            
-            if note_id not in note_rankings:
-                note_rankings[note_id] = {
-                    'account_ranks': {},
-                    'search_records': []
-                }
-            
-            note_rankings[note_id]['account_ranks'][account] = rank
-            note_rankings[note_id]['search_records'].append(result)
+        search_df = pd.DataFrame.from_records(
+            search_results, columns=['id', 'note_id', 'search_account', 'rank', 'created_at']
+        )
         
-        all_accounts = sorted(list(all_accounts))
-        account_count = len(all_accounts)
+        # 过滤缺少note_id、账户或排名的记录
+        search_df = search_df.dropna(subset=['note_id', 'search_account', 'rank'])
+        search_df = search_df[(search_df['note_id'] != '') & (search_df['search_account'] != '')]
         
-        logger.info(f"[DataMergerTool] 发现 {account_count} 个搜索账户: {all_accounts}")
+        if search_df.empty:
+            return pd.DataFrame(columns=RANKING_COLUMNS).set_index('note_id')
         
-        # 计算每个note_id的RRF分数
-        merged_rankings = {}
+        # note_id和账户各编码为整数一次（均按首次出现顺序，账户无需再排序），之后只按整数下标处理
+        note_codes, note_ids = pd.factorize(search_df['note_id'])
+        account_codes, accounts = pd.factorize(search_df['search_account'])
         
-        for note_id, data in note_rankings.items():
-            account_ranks = data['account_ranks']
-            
-            # 收集各账户的排名，缺失的用None表示
-            ranks = []
-            for account in all_accounts:
-                ranks.append(account_ranks.get(account))
-            
-            # 计算RRF分数
-            rrf_score = self._calculate_rrf_score(ranks)
-            
-            merged_rankings[note_id] = {
-                'rrf_score': rrf_score,
-                'account_ranks': account_ranks,
-                'account_list': all_accounts,
-                'search_records': data['search_records']
-            } 
-        
-        # RRF算法：分数越高越好（降序排列）
-        sorted_notes = sorted(merged_rankings.items(), 
-                            key=lambda x: x[1]['rrf_score'], reverse=True)
-        
-        # 分配最终排名
-        for final_rank, (note_id, data) in enumerate(sorted_notes, 1):
-            merged_rankings[note_id]['final_rank'] = final_rank
-            merged_rankings[note_id]['merged_rank'] = data['rrf_score']  # 保持兼容性
+        # 按note_id × 账户收集排名（同一账户多次出现时后写入的覆盖前者，即取最后一次）
+        rank_matrix = np.full((len(note_ids), len(accounts)), np.nan)
+        rank_matrix[note_codes, account_codes] = search_df['rank'].to_numpy(dtype=float)
+        
+        all_accounts = tuple(accounts)
+        logger.info(f"[DataMergerTool] 发现 {len(all_accounts)} 个搜索账户: {list(all_accounts)}")
+        
+        # 第一个搜索记录作为代表（用于获取基本搜索信息），note_codes按首次出现编号，首次出现位置即按编码排列
+        _, first_positions = np.unique(note_codes, return_index=True)
+        representative = search_df.iloc[first_positions]
+        
+        # 计算每个note_id的RRF分数，缺失的账户排名不参与计算
+        rrf_scores = self._calculate_rrf_score(rank_matrix)
+        
+        # RRF算法：分数越高越好（降序排列，同分保持首次出现顺序），各列按排序下标取值后直接构建结果，无需再排序DataFrame
+        order = np.argsort(-rrf_scores, kind='stable')
+        
+        rankings = pd.DataFrame({
+            'search_id': representative['id'].to_numpy()[order],
+            'rank': np.arange(1, len(order) + 1),
+            'rrf_score': rrf_scores[order].round(4),
+            'account_ranks': self._format_account_ranks(rank_matrix[order], all_accounts),
+            'data_crawler_time': representative['created_at'].to_numpy()[order],
+            'account_coverage': self._count_account_coverage(rank_matrix[order]),
+        }, index=pd.Index(note_ids[order], name='note_id'))
         
         # 记录排序结果
         logger.info(f"[DataMergerTool] RRF排序示例（前5名）:")
         
-        for i, (note_id, data) in enumerate(sorted_notes[:5]):
-            account_ranks_str = ', '.join([f"{acc}:{data['account_ranks'].get(acc, 'N/A')}" 
-                                         for acc in all_accounts])
-            
-            coverage = len([r for r in [data['account_ranks'].get(acc) for acc in all_accounts] if r is not None])
-            
-            logger.info(f"  {i+1}. {note_id}: RRF分数={data['rrf_score']:.4f}, "
+        # 账户排名直接复用已格式化的字符串
+        top_rankings = rankings.head(5)
+        for i, (note_id, rrf_score, coverage, ranks_str) in enumerate(
+            zip(top_rankings.index, top_rankings['rrf_score'], top_rankings['account_coverage'], top_rankings['account_ranks'])
+        ):
+            logger.info(f"  {i+1}. {note_id}: RRF分数={rrf_score:.4f}, "
                        f"覆盖账户={coverage}/{len(all_accounts)}, "
-                       f"各账户排名=[{account_ranks_str}]")
+                       f"各账户排名=[{ranks_str.replace('; ', ', ')}]")
         
-        return merged_rankings
+        return rankings
     
-    def _calculate_rrf_score(self, ranks: List[Optional[int]], k: int = 60) -> float:
+    def _rankings_from_rrf_rows(self, rrf_rows: List[Dict]) -> pd.DataFrame:
+        """
+        将数据库RPC返回的RRF排名转换为与_merge_multi_account_rankings相同结构的DataFrame
+        
+        Args:
+            rrf_rows: 按RRF分数降序排列的记录（每个note_id一行，accounts/ranks为对齐的数组）
+        """
+        # 账户按在结果中首次出现的顺序编号
+        accounts = list(dict.fromkeys(
+            account for row in rrf_rows for account in (row.get('accounts') or [])
+        ))
+        account_index = {account: j for j, account in enumerate(accounts)}
+        
+        rank_matrix = np.full((len(rrf_rows), len(accounts)), np.nan)
+        for i, row in enumerate(rrf_rows):
+            for account, rank in zip(row.get('accounts') or [], row.get('ranks') or []):
+                rank_matrix[i, account_index[account]] = rank
+        
+        logger.info(f"[DataMergerTool] 发现 {len(accounts)} 个搜索账户: {accounts}")
+        
+        return pd.DataFrame({
+            'search_id': [row.get('search_id') for row in rrf_rows],
+            'rank': np.arange(1, len(rrf_rows) + 1),
+            'rrf_score': np.round([float(row.get('rrf_score') or 0) for row in rrf_rows], 4),
+            'account_ranks': self._format_account_ranks(rank_matrix, accounts),
+            'data_crawler_time': [row.get('data_crawler_time') for row in rrf_rows],
+            'account_coverage': self._count_account_coverage(rank_matrix),
+        }, index=pd.Index([row['note_id'] for row in rrf_rows], name='note_id'))
+    
+    def _format_account_ranks(self, rank_matrix: np.ndarray, accounts: Iterable[str]) -> np.ndarray:
+        """将笔记×账户的排名矩阵格式化为"账户:排名; ..."字符串，未出现（或排名为0）的账户记为N/A"""
+        # 排名矩阵整体转为文本标签，再按账户顺序预先生成的模板逐行填充
+        has_rank = self._has_account_rank(rank_matrix)
+        rank_labels = np.where(has_rank, np.nan_to_num(rank_matrix).astype(np.int64).astype(str), 'N/A')
+        template = '; '.join(f"{str(account).replace('{', '{{').replace('}', '}}')}:{{}}" for account in accounts)
+        return np.array([template.format(*row) for row in rank_labels.tolist()], dtype=object)
+    
+    def _has_account_rank(self, rank_matrix: np.ndarray) -> np.ndarray:
+        """排名矩阵中有效排名的位置（未出现或排名为0的账户视为无排名）"""
+        return ~np.isnan(rank_matrix) & (rank_matrix != 0)
+    
+    def _count_account_coverage(self, rank_matrix: np.ndarray) -> np.ndarray:
+        """每个笔记有有效排名的账户数"""
+        return np.count_nonzero(self._has_account_rank(rank_matrix), axis=1)
+    
+    def _drop_unmatched_rankings(self, merged_rankings: pd.DataFrame, note_details: List[Dict]) -> pd.DataFrame:
+        """丢弃没有笔记详情的排序结果，并按原有顺序重新分配连续的最终排名"""
+        matched_ids = {note['note_id'] for note in note_details}
+        matched_rankings = merged_rankings[merged_rankings.index.isin(matched_ids)].copy()
+        matched_rankings['rank'] = range(1, len(matched_rankings) + 1)
+        return matched_rankings
+    
+    def _calculate_rrf_score(self, ranks: np.ndarray, k: int = 60) -> np.ndarray:
         """
         倒数排名融合算法（Reciprocal Rank Fusion - RRF）
         
@@ -249,114 +443,101 @@ class DataMergerTool:
         适用于小红书多账户搜索结果合并，解决原始算法对单账户高排名过于友好的问题。
         
         Args:
-            ranks: 各账户的排名列表，None表示未出现
+            ranks: 笔记×账户的排名矩阵，NaN表示该笔记未在该账户中出现
             k: RRF常数，通常设为60，用于平滑排名差异
             
         Returns:
-            RRF分数（越高越好，需要按降序排列）
+            每个笔记的RRF分数数组（越高越好，需要按降序排列）
             
         Example:
-            ranks = [1, None, None, None]  # 单账户排名1
-            rrf_score = 1/(60+1) = 0.0164
-            
-            ranks = [5, 7, 9, None]  # 多账户排名5,7,9  
-            rrf_score = 1/(60+5) + 1/(60+7) + 1/(60+9) = 0.0448
+            ranks = [[1, nan, nan, nan],  # 单账户排名1
+                     [5, 7, 9, nan]]      # 多账户排名5,7,9
+            rrf_score = [1/(60+1),
+                         1/(60+5) + 1/(60+7) + 1/(60+9)]
+                      = [0.0164, 0.0448]
             
             结果：多账户稳定排名获得更高分数
         """
-        valid_ranks = [r for r in ranks if r is not None]
-        
-        if not valid_ranks:
-            # 完全没有出现的内容，返回最低分数
-            return 0.0
-        
-        # 计算RRF分数：对所有有效排名计算倒数和
+        # 计算RRF分数：对所有有效排名计算倒数和，整个矩阵一次完成
         # 公式：RRF_score = Σ(1/(k + rank_i))
-        rrf_score = sum(1.0 / (k + rank) for rank in valid_ranks)
-        
-        # RRF分数越高排名越好
-        return rrf_score
+        # 缺失排名（NaN）不参与求和，完全没有出现的内容得到最低分数0
+        return np.nansum(1.0 / (k + ranks), axis=1)
     
-    def _merge_data_with_rankings(self, merged_rankings: Dict, note_details: List[Dict], keyword: str) -> List[Dict]:
+    def _merge_data_with_rankings(self, merged_rankings: pd.DataFrame, note_details: List[Dict], keyword: str) -> pd.DataFrame:
         """
         使用RRF排序结果拼接数据
         
+        排序结果和笔记详情分别构建为DataFrame，通过note_id做多对一左连接
+        
         Args:
-            merged_rankings: RRF排序结果
+            merged_rankings: RRF排序结果（以note_id为索引，已按最终排名排列）
             note_details: 笔记详情列表
             keyword: 关键词
             
         Returns:
-            拼接后的数据列表
+            拼接后的宽表（按最终排名排列）
         """
-        # 将笔记详情转换为字典，以note_id为key
-        note_dict = {note['note_id']: note for note in note_details}
+        # 整批笔记涉及的品牌名只标准化一次，逐条记录改为查表
+        brand_table = self._build_brand_table(note_details)
         
-        merged_data = []
+        normalized_brand_data = [self._normalize_brand_fields(note_detail, brand_table) for note_detail in note_details]
         
-        # 按最终排名排序处理
-        sorted_rankings = sorted(merged_rankings.items(), key=lambda x: x[1]['final_rank'])
+        # 笔记详情表按列构建（每列一个列表直接交给DataFrame，不再逐条记录写回和行转列），品牌相关列取标准化结果
+        note_columns = {
+            col: [note_detail.get(col) for note_detail in note_details]
+            for col in NOTE_COLUMNS if col not in BRAND_JSON_FIELDS
+        }
+        for field in BRAND_JSON_FIELDS:
+            note_columns[field] = [brand_data[field] for brand_data in normalized_brand_data]
         
-        for note_id, ranking_data in sorted_rankings:
-            note_detail = note_dict.get(note_id, {})
-            
-            # 对品牌相关字段进行标准化处理
-            normalized_brand_data = self._normalize_brand_fields(note_detail)
-            
-            # 获取第一个搜索记录作为代表（用于获取基本搜索信息）
-            representative_search = ranking_data['search_records'][0] if ranking_data['search_records'] else {}
-            
-            # 构建账户排名信息字符串
-            account_ranks_info = []
-            for account in ranking_data['account_list']:
-                rank = ranking_data['account_ranks'].get(account)
-                account_ranks_info.append(f"{account}:{rank if rank else 'N/A'}")
-            
-            # 合并记录
-            merged_record = {
-                # 搜索结果字段（使用代表性记录）
-                'search_id': representative_search.get('id'),
-                'keyword': keyword,
-                'rank': ranking_data['final_rank'],  # 最终排名
-                'rrf_score': round(ranking_data['rrf_score'], 4),  # RRF分数
-                'account_ranks': '; '.join(account_ranks_info),  # 各账户排名详情
-                'note_id': note_id,
-                
-                # 笔记详情字段
-                'title': note_detail.get('title'),
-                'type': note_detail.get('type'),
-                'desc': note_detail.get('desc'),
-                'note_url': note_detail.get('note_url'),
-                'video_url': note_detail.get('video_url'),
-                'image_list': note_detail.get('image_list'),
-                'tag_list': note_detail.get('tag_list'),
-                'author_id': note_detail.get('author_id'),
-                'nickname': note_detail.get('nickname'),
-                'last_update_time': note_detail.get('last_update_time'),
-                'liked_count': note_detail.get('liked_count'),
-                'collected_count': note_detail.get('collected_count'),
-                'comment_count': note_detail.get('comment_count'),
-                'share_count': note_detail.get('share_count'),
-                
-                # 使用标准化后的品牌数据
-                'brand_list': normalized_brand_data['brand_list'],
-                'spu_list': note_detail.get('spu_list'),
-                'emotion_dict': normalized_brand_data['emotion_dict'],
-                'evaluation_dict': normalized_brand_data['evaluation_dict'],
-                
-                # 数据状态标识
-                'has_note_detail': bool(note_detail),
-                'has_brand_info': self._has_valid_brand_info(normalized_brand_data['brand_list']),
-                'data_crawler_time': representative_search.get('created_at'),
+        # 重复的note_id保留最后一条，保证连接右侧每个note_id唯一
+        notes_df = pd.DataFrame(note_columns, columns=NOTE_COLUMNS)
+        notes_df = notes_df.drop_duplicates('note_id', keep='last')
         
-            }
-            
-            merged_data.append(merged_record)
+        # 排序结果表
+        rankings_df = merged_rankings.reset_index()[RANKING_COLUMNS].assign(keyword=keyword)
+        
+        # 按note_id左连接笔记详情：多对一校验，保持排序结果的行顺序，indicator标记是否匹配
+        merged_df = rankings_df.merge(
+            notes_df, on='note_id', how='left', validate='many_to_one', sort=False, indicator=True
+        )
+        
+        # 数据状态标识（连接后按列计算，未匹配笔记的brand_list为NaN，判定为无品牌信息）
+        merged_df['has_note_detail'] = merged_df['_merge'].eq('both').to_numpy()
+        merged_df['has_brand_info'] = merged_df['brand_list'].map(self._has_valid_brand_info).astype(bool)
+        
+        return merged_df[MERGED_COLUMNS].reset_index(drop=True)
+    
+    def _parse_brand_fields(self, note_details: List[Dict]):
+        """将笔记的品牌列表、情感字典和评价字典就地解析为Python对象（每条笔记只解析一次，后续步骤直接复用）"""
+        for note_detail in note_details:
+            for field in BRAND_JSON_FIELDS:
+                note_detail[field] = self._parse_json_field(note_detail.get(field))
+    
+    def _build_brand_table(self, note_details: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+        """收集所有笔记中的品牌名（品牌列表及情感/评价字典的键），构建标准化查找表"""
+        # 直接收集为集合，重复出现的品牌名不再进入待标准化列表
+        brand_names = set()
+        for note_detail in note_details:
+            brand_list = note_detail.get('brand_list')
+            if not isinstance(brand_list, list) or not brand_list:
+                continue
+            brand_names.update(brand for brand in brand_list if isinstance(brand, str))
+            for field in ('emotion_dict', 'evaluation_dict'):
+                field_value = note_detail.get(field)
+                if isinstance(field_value, dict):
+                    brand_names.update(field_value.keys())
         
-        return merged_data
+        return self.brand_normalizer.build_lookup_table(brand_names)
     
-    def _normalize_brand_fields(self, note_detail: Dict) -> Dict:
-        """标准化品牌相关字段"""
+    def _normalize_brand_fields(self, note_detail: Dict, brand_table: Optional[Dict[str, str]] = None) -> Dict:
+        """
+        标准化品牌相关字段
+        
+        Args:
+            note_detail: 笔记详情（品牌相关字段已由_parse_brand_fields解析）
+            brand_table: 预先构建的品牌名查找表，未命中时回退到逐个标准化
+        """
         result = {
             'brand_list': note_detail.get('brand_list'),
             'emotion_dict': note_detail.get('emotion_dict'),
@@ -366,50 +547,48 @@ class DataMergerTool:
         if not note_detail:
             return result
         
+        if brand_table is None:
+            brand_table = {}
+        
+        def normalize(brand_name: str) -> str:
+            normalized_brand = brand_table.get(brand_name)
+            if normalized_brand is None:
+                normalized_brand = self.brand_normalizer.normalize_brand_name(brand_name)
+            return normalized_brand
+        
         try:
             # 1. 标准化品牌列表
-            brand_list = self._parse_json_field(note_detail.get('brand_list'))
+            brand_list = result['brand_list']
             if isinstance(brand_list, list) and brand_list:
-                normalized_brands = []
-                brand_mapping = {}  # 原始品牌名 -> 标准化品牌名的映射
+                brand_mapping = {}  # 原始品牌名 -> 标准化品牌名的映射（重复的原始品牌名只处理一次）
                 
                 for original_brand in brand_list:
-                    if original_brand and isinstance(original_brand, str):
-                        normalized_brand = self.brand_normalizer.normalize_brand_name(original_brand.strip())
+                    if original_brand and isinstance(original_brand, str) and original_brand not in brand_mapping:
+                        normalized_brand = normalize(original_brand)
                         if normalized_brand:
-                            normalized_brands.append(normalized_brand)
                             brand_mapping[original_brand] = normalized_brand
                 
-                # 去重但保持顺序
-                seen = set()
-                unique_normalized_brands = []
-                for brand in normalized_brands:
-                    if brand not in seen:
-                        unique_normalized_brands.append(brand)
-                        seen.add(brand)
-                
-                result['brand_list'] = unique_normalized_brands
+                # 映射按原始品牌名首次出现排列，对其值去重即得保持顺序的标准化品牌列表
+                result['brand_list'] = list(dict.fromkeys(brand_mapping.values()))
                 
                 # 2. 更新情感字典中的品牌名
-                emotion_dict = self._parse_json_field(note_detail.get('emotion_dict'))
+                emotion_dict = result['emotion_dict']
                 if isinstance(emotion_dict, dict) and emotion_dict:
                     normalized_emotion_dict = {}
                     for original_brand, emotion_info in emotion_dict.items():
                         # 查找对应的标准化品牌名
-                        normalized_brand = brand_mapping.get(original_brand, 
-                                                           self.brand_normalizer.normalize_brand_name(original_brand))
+                        normalized_brand = brand_mapping.get(original_brand) or normalize(original_brand)
                         if normalized_brand:
                             normalized_emotion_dict[normalized_brand] = emotion_info
                     result['emotion_dict'] = normalized_emotion_dict
                 
                 # 3. 更新评价字典中的品牌名
-                evaluation_dict = self._parse_json_field(note_detail.get('evaluation_dict'))
+                evaluation_dict = result['evaluation_dict']
                 if isinstance(evaluation_dict, dict) and evaluation_dict:
                     normalized_evaluation_dict = {}
                     for original_brand, evaluation_info in evaluation_dict.items():
                         # 查找对应的标准化品牌名
-                        normalized_brand = brand_mapping.get(original_brand,
-                                                           self.brand_normalizer.normalize_brand_name(original_brand))
+                        normalized_brand = brand_mapping.get(original_brand) or normalize(original_brand)
                         if normalized_brand:
                             normalized_evaluation_dict[normalized_brand] = evaluation_info
                     result['evaluation_dict'] = normalized_evaluation_dict
@@ -429,38 +608,28 @@ class DataMergerTool:
     
     def _parse_json_field(self, field_value: Any) -> Any:
         """安全解析JSON字段"""
-        if pd.isna(field_value):
-            return []
-        
-        try:
-            if isinstance(field_value, str):
-                return self.file_manager.parse_json_string(field_value)
+        if isinstance(field_value, (list, dict)):
             return field_value
-        except (ValueError, TypeError):
+        if isinstance(field_value, (str, bytes)):
+            if not field_value:
+                return []
+            try:
+                return orjson.loads(field_value)
+            except orjson.JSONDecodeError:
+                return []
+        
+        # 空值（None、NaN、pd.NA）直接返回空列表，无需经过pd.isna的类型分派
+        if field_value is None or field_value is pd.NA or (isinstance(field_value, float) and field_value != field_value):
             return []
+        return field_value
     
     def _has_valid_brand_info(self, brand_list) -> bool:
-        """判断是否有有效的品牌信息"""
-        if not brand_list:  # None, '', False, 0 等falsy值
-            return False
-        
-        # 如果是字符串，尝试解析为JSON
-        if isinstance(brand_list, str):
-            try:
-                parsed_list = json.loads(brand_list)
-                return isinstance(parsed_list, list) and len(parsed_list) > 0
-            except (json.JSONDecodeError, TypeError):
-                return False
-        
-        # 如果已经是列表，检查是否非空
-        if isinstance(brand_list, list):
-            return len(brand_list) > 0
-        
-        # 其他情况返回False
-        return False
+        """判断是否有有效的品牌信息（brand_list在获取笔记详情后已解析为列表，未匹配的笔记为NaN）"""
+        return isinstance(brand_list, list) and len(brand_list) > 0
     
-    def _save_to_csv(self, data: List[Dict], keyword: str, output_dir_inner: str, output_dir_outer: str) -> str:
-        """保存数据到CSV文件（只保存前100名）"""
+    def _save_to_csv(self, data: pd.DataFrame, keyword: str, output_dir_inner: str, output_dir_outer: str,
+                     output_format: str = "csv") -> str:
+        """保存数据到CSV文件（data为已筛选的前100名；output_format为parquet时内部数据额外保存一份Parquet）"""
         
         # 生成文件名
         timestamp = datetime.now().strftime("%Y%m%d")
@@ -471,81 +640,67 @@ class DataMergerTool:
         self.file_manager.ensure_directory(output_dir_inner)
         self.file_manager.ensure_directory(output_dir_outer)
         
-        # 按rank排序并只取前100名
-        sorted_data = sorted(data, key=lambda x: x.get('rank', float('inf')))
-        top_100_data = sorted_data[:100]
-        
-        logger.info(f"[DataMergerTool] 原始数据{len(data)}条，筛选前100名后为{len(top_100_data)}条")
+        df = data.astype(MERGED_DTYPES, errors='ignore')
         
         filename = f"merged_data_{timestamp}.csv"
         filepath = self.file_manager.build_path(output_dir_inner, filename)
         
-        # 转换为DataFrame并保存
-        df = pd.DataFrame(top_100_data)
-        
         # 处理JSON字段，转换为字符串
-        json_columns = ['image_list', 'tag_list', 'brand_list', 'spu_list', 'emotion_dict', 'evaluation_dict']
-        for col in json_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: self.file_manager.to_json_string(x, ensure_ascii=False) if x else '')
+        for col in JSON_COLUMNS:
+            df[col] = [_to_json_cell(value) for value in df[col].to_numpy()]
+        
+        # 混杂类型的计数列会让Arrow转换失败并回退到pandas写出
+        _stringify_mixed_columns(df)
         
         # 生成对外输出的中文CSV文件
         outer_filename = f"basic_data_{timestamp}.csv"
         outer_filepath = self.file_manager.build_path(output_dir_outer, outer_filename)
         
-        # 筛选column_mapping中存在的列并重命名为中文
-        available_columns = [col for col in self.column_mapping.keys() if col in df.columns]
-        df_chinese = df[available_columns].copy()
-        df_chinese.rename(columns=self.column_mapping, inplace=True)
-
-        # 保存CSV
-        self.file_manager.save_csv(df, filepath)
-        self.file_manager.save_csv(df_chinese, outer_filepath)
+        # 保存内部数据：SOV和情感分析工具按CSV查找输入，CSV始终写出，Parquet仅作为附加格式
+        self.file_manager.save_csv(df, filepath, engine='pyarrow', chunksize=CSV_CHUNK_SIZE)
+        if output_format == "parquet":
+            try:
+                parquet_path = self.file_manager.save_parquet(df, filepath[:-len(".csv")] + ".parquet")
+                logger.info(f"[DataMergerTool] 内部数据Parquet副本已保存到: {parquet_path}")
+            except (ImportError, ValueError, TypeError) as e:
+                logger.warning(f"[DataMergerTool] Parquet写入失败，仅保存CSV: {e}")
+        
+        # 对外数据始终保存为CSV：只写出column_mapping中的列并以中文作表头，不再单独构建重命名后的表
+        # 对外文件供人工查看，沿用pandas的输出格式（仅必要时加引号）
+        self.file_manager.save_csv(
+            df, outer_filepath, chunksize=CSV_CHUNK_SIZE,
+            columns=self._outer_columns, header=self._outer_headers,
+        )
         
         logger.info(f"[DataMergerTool] 内部数据已保存到: {filepath}")
         logger.info(f"[DataMergerTool] 对外数据已保存到: {outer_filepath}")
         return filepath
     
-    def _generate_statistics(self, merged_data: List[Dict], keyword: str) -> Dict[str, Any]:
-        """生成统计信息"""
+    def _generate_statistics(self, merged_data: pd.DataFrame, merged_rankings: pd.DataFrame,
+                             keyword: str) -> Dict[str, Any]:
+        """生成统计信息（账户覆盖数取自排序结果的account_coverage列）"""
         total_count = len(merged_data)
-        matched_count = sum(1 for record in merged_data if record['has_note_detail'])
-        unmatched_count = total_count - matched_count
-        with_brand_count = sum(1 for record in merged_data if record['has_brand_info'])
+        matched_count = int(merged_data['has_note_detail'].sum())
+        with_brand_count = int(merged_data['has_brand_info'].sum())
         
-        # 计算唯一品牌数
+        # 计算唯一品牌数（仅有品牌信息的记录；brand_list已是标准化后的列表，无需再解析）
         all_brands = set()
-        for record in merged_data:
-            if record.get('brand_list'):
-                try:
-                    brands = record['brand_list'] if isinstance(record['brand_list'], list) else json.loads(record['brand_list'] or '[]')
-                    all_brands.update(brands)
-                except:
-                    pass
+        for brand_list in merged_data.loc[merged_data['has_brand_info'], 'brand_list']:
+            if isinstance(brand_list, list):
+                all_brands.update(brand_list)
         
         # 计算平均RRF分数
-        rrf_scores = [record['rrf_score'] for record in merged_data if record.get('rrf_score') is not None]
-        avg_rrf_score = sum(rrf_scores) / len(rrf_scores) if rrf_scores else 0
-        
-        # 计算账户覆盖统计
-        account_coverage = []
-        for record in merged_data:
-            account_ranks = record.get('account_ranks', '')
-            if account_ranks:
-                # 统计有排名的账户数（不是N/A的）
-                ranks_list = account_ranks.split('; ')
-                coverage = sum(1 for rank_info in ranks_list if not rank_info.endswith(':N/A'))
-                account_coverage.append(coverage)
-        
-        avg_account_coverage = sum(account_coverage) / len(account_coverage) if account_coverage else 0
-        max_account_count = max(account_coverage) if account_coverage else 0
+        avg_rrf_score = merged_data['rrf_score'].mean() if total_count else 0
+        
+        # 计算账户覆盖统计：按note_id取排序时由排名矩阵统计的有效账户数，不再解析account_ranks展示字符串
+        account_coverage = merged_rankings['account_coverage'].reindex(merged_data['note_id']).dropna()
         
         return {
             'matched_count': matched_count,
-            'unmatched_count': unmatched_count,
+            'unmatched_count': total_count - matched_count,
             'with_brand_count': with_brand_count,
             'unique_brands': len(all_brands),
             'avg_rrf_score': avg_rrf_score,
-            'account_count': max_account_count,  # 最大账户覆盖数
-            'avg_account_per_note': avg_account_coverage  # 平均每个笔记的账户覆盖数
-        } 
\ No newline at end of file
+            'account_count': int(account_coverage.max()) if len(account_coverage) else 0,  # 最大账户覆盖数
+            'avg_account_per_note': account_coverage.mean() if len(account_coverage) else 0  # 平均每个笔记的账户覆盖数
+        }
@@ -1,14 +1,58 @@
-import json
 import re
+import json
+import hashlib
+import httpx
+import orjson
 import requests
 import os
 import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
 from crewai.tools import BaseTool
 from openai import OpenAI
 
 logger = logging.getLogger(__name__)
 
+# LLM输出中的JSON代码块（模块加载时编译一次）
+_JSON_BLOCK_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+_CODE_BLOCK_RE = re.compile(r'```\s*(.*?)\s*```', re.DOTALL)
+
+# 情感标签标准化映射
+_EMOTION_MAP = {
+    "positive": "正向", "正面": "正向", "好": "正向", "积极": "正向",
+    "negative": "负向", "负面": "负向", "差": "负向", "消极": "负向",
+    "neutral": "中立", "一般": "中立", "普通": "中立", "客观": "中立"
+}
+_VALID_EMOTIONS = frozenset(("正向", "负向", "中立"))
+
+# 单条笔记提交给模型的图片上限及有效图片地址
+MAX_IMAGES_PER_NOTE = 5
+_IMAGE_URL_RE = re.compile(r'https?://', re.IGNORECASE)
+
+QWEN_VL_MODEL = "qwen-vl-max-latest"
+QWEN_VL_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+# 模型接口连接池：HTTP/2复用同一TLS连接，多个分析器并发调用时不再重复握手；视频分析耗时较长，读超时放宽
+QWEN_VL_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+QWEN_VL_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+# 分析结果缓存：同一笔记内容重复提交（重试、重新排队）时直接复用，不再调用模型
+LLM_RESULT_CACHE_SIZE = 1024
+_llm_result_cache: "OrderedDict[str, str]" = OrderedDict()
+# 多个分析器可能在线程池中并发调用，读写缓存（含LRU顺序调整和淘汰）需加锁
+_llm_result_cache_lock = threading.Lock()
+
+def _llm_cache_key(content: str, content_type: str) -> str:
+    """按模型、内容类型和输入内容计算缓存键"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (QWEN_VL_MODEL, content_type, content):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+# 从指定位置解析出一个完整JSON值（C实现的扫描器）
+_JSON_DECODER = json.JSONDecoder()
+
 class MultimodalBrandAnalyzer(BaseTool):
     """基于通义千问VL的多模态品牌分析工具"""
     name: str = "multimodal_brand_analyzer"
@@ -29,7 +73,12 @@ class MultimodalBrandAnalyzer(BaseTool):
             
             self.client = OpenAI(
                 api_key=dashscope_api_key,
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+                base_url=QWEN_VL_BASE_URL,
+                http_client=httpx.Client(
+                    http2=True,
+                    limits=QWEN_VL_HTTP_LIMITS,
+                    timeout=QWEN_VL_TIMEOUT,
+                ),
             )
             logger.info("✅ 通义千问VL客户端初始化成功")
                 
@@ -43,6 +92,15 @@ class MultimodalBrandAnalyzer(BaseTool):
             if not self.client:
                 return self._create_error_result("client_not_initialized", "客户端未初始化")
             
+            cache_key = _llm_cache_key(content, content_type)
+            with _llm_result_cache_lock:
+                cached = _llm_result_cache.get(cache_key)
+                if cached is not None:
+                    _llm_result_cache.move_to_end(cache_key)
+            if cached is not None:
+                logger.info("[MultimodalBrandAnalyzer] 命中分析结果缓存，跳过模型调用")
+                return cached
+            
             # 解析输入内容
             note_data = self._parse_input_content(content)
             if not note_data:
@@ -50,34 +108,43 @@ class MultimodalBrandAnalyzer(BaseTool):
             
             # test
             # logger.info(f"[MultimodalBrandAnalyzer] type of note_data: {type(note_data)}")
-            logger.info(f"[MultimodalBrandAnalyzer] content_type: {content_type}")
-            logger.info(f"[MultimodalBrandAnalyzer] note_data: {note_data}")
+            logger.info("[MultimodalBrandAnalyzer] content_type: %s", content_type)
+            logger.debug("[MultimodalBrandAnalyzer] note_data: %s", note_data)
         
             # 构建多模态消息
             messages = self._build_multimodal_messages(note_data, content_type)
             
             # 调用Qwen-VL
             result = self._call_LLM(messages)
-            logger.info(f"[MultimodalBrandAnalyzer] raw result: {result}")
+            logger.debug("[MultimodalBrandAnalyzer] raw result: %s", result)
             
             # 解析和标准化结果
             parsed_result = self._parse_llm_result(result)
             # logger.info(f"[MultimodalBrandAnalyzer] parsed result: {parsed_result}")
 
-            return json.dumps(parsed_result, ensure_ascii=False)
+            output = orjson.dumps(parsed_result).decode('utf-8')
+            
+            # 只缓存成功的结果，失败的分析下次仍会重新调用模型
+            if not parsed_result.get("_analysis_failed"):
+                with _llm_result_cache_lock:
+                    _llm_result_cache[cache_key] = output
+                    _llm_result_cache.move_to_end(cache_key)
+                    if len(_llm_result_cache) > LLM_RESULT_CACHE_SIZE:
+                        _llm_result_cache.popitem(last=False)
+            return output
             
         except Exception as e:
             logger.error(f"[MultimodalBrandAnalyzer] 分析过程异常: {e}")
             error_result = self._create_error_result("analysis_exception", str(e))
-            return json.dumps(error_result, ensure_ascii=False)
+            return orjson.dumps(error_result).decode('utf-8')
     
     def _parse_input_content(self, content: str) -> Optional[Dict[str, Any]]:
         """解析输入内容，支持直接文本或JSON格式的笔记数据"""
         try:
             # 尝试解析为JSON
-            note_data = json.loads(content)
+            note_data = orjson.loads(content)
             return note_data
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             # 如果不是JSON，则作为纯文本处理
             return {
                 'title': '',
@@ -112,17 +179,24 @@ class MultimodalBrandAnalyzer(BaseTool):
         
         # 添加图片内容
         if content_type == 'image':
-            image_list = note_data.get('image_list', '').split(',')
-            if isinstance(image_list, list) and image_list:
-                for image_url in image_list[:5]:  # 限制最多5张图片
-                    if image_url and isinstance(image_url, str):
-                        content_parts.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image_url
-                            }
-                        })
-            logger.info(f"[MultimodalBrandAnalyzer] image_list: {image_list}")
+            image_list = note_data.get('image_list') or []
+            if isinstance(image_list, str):
+                image_list = image_list.split(',')
+            elif not isinstance(image_list, list):
+                image_list = []
+            # 去除空项、非http地址和重复图片（保持原顺序），最多5张，减少模型按图计费的token
+            image_list = list(dict.fromkeys(
+                url for url in (item.strip() for item in image_list if isinstance(item, str))
+                if _IMAGE_URL_RE.match(url)
+            ))[:MAX_IMAGES_PER_NOTE]
+            for image_url in image_list:
+                content_parts.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url
+                    }
+                })
+            logger.debug("[MultimodalBrandAnalyzer] image_list: %s", image_list)
         
         messages = [
             {
@@ -167,7 +241,7 @@ class MultimodalBrandAnalyzer(BaseTool):
         """调用通义千问VL模型"""
         try:
             completion = self.client.chat.completions.create(
-                model="qwen-vl-max-latest",
+                model=QWEN_VL_MODEL,
                 messages=messages,
                 temperature=0.1,
                 max_tokens=2048,
@@ -175,7 +249,7 @@ class MultimodalBrandAnalyzer(BaseTool):
             )
             
             result = completion.choices[0].message.content
-            logger.info(f"✅ 通义千问VL调用成功，返回内容长度: {len(result)}")
+            logger.info("✅ 通义千问VL调用成功，返回内容长度: %d", len(result))
             return result
             
         except Exception as e:
@@ -185,13 +259,11 @@ class MultimodalBrandAnalyzer(BaseTool):
     def _parse_llm_result(self, llm_output: str) -> Dict[str, Any]:
         """解析LLM输出"""
         try:
-            # 提取JSON字符串
-            json_str = self._extract_json_string(llm_output)
-            if not json_str:
+            # 提取并解析JSON（提取时已完成解析，不再二次解析）
+            parsed = self._extract_json_object(llm_output)
+            if parsed is None:
                 return self._create_error_result("json_extraction_failed", "无法从LLM输出中提取JSON")
             
-            # 解析JSON
-            parsed = json.loads(json_str)
             if not isinstance(parsed, dict):
                 return self._create_error_result("invalid_format", "解析结果不是字典格式")
             
@@ -199,76 +271,67 @@ class MultimodalBrandAnalyzer(BaseTool):
             result = self._standardize_result(parsed)
             return result
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON解析错误: {e}")
             return self._create_error_result("json_decode_error", f"JSON解析错误: {str(e)}")
         except Exception as e:
             logger.error(f"解析过程出错: {e}")
             return self._create_error_result("parsing_error", f"解析过程出错: {str(e)}")
     
-    def _extract_json_string(self, text: str) -> Optional[str]:
-        """从文本中提取JSON字符串"""
+    def _extract_json_object(self, text: str) -> Optional[Any]:
+        """从文本中提取并解析JSON，返回解析结果；找不到JSON时返回None（代码块内容无法解析时抛出JSONDecodeError）"""
         text = text.strip()
         
         # 方法1: 检查是否为纯JSON
         if text.startswith('{') and text.endswith('}'):
-            return text
-        
-        # 方法2: 查找```json```代码块
-        json_match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
-        if json_match:
-            return json_match.group(1).strip()
-        
-        # 方法3: 查找```代码块
-        code_match = re.search(r'```\s*(.*?)\s*```', text, re.DOTALL)
-        if code_match:
-            content = code_match.group(1).strip()
-            if content.startswith('{') and content.endswith('}'):
-                return content
+            return orjson.loads(text)
         
-        # 方法4: 提取第一个完整的JSON对象
-        brace_count = 0
-        start_pos = -1
-        for i, char in enumerate(text):
-            if char == '{':
-                if brace_count == 0:
-                    start_pos = i
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-                if brace_count == 0 and start_pos != -1:
-                    return text[start_pos:i+1]
+        # 没有代码块标记时跳过方法2、3的正则扫描
+        if '```' in text:
+            # 方法2: 查找```json```代码块
+            json_match = _JSON_BLOCK_RE.search(text)
+            if json_match:
+                json_str = json_match.group(1).strip()
+                return orjson.loads(json_str) if json_str else None
+            
+            # 方法3: 查找```代码块
+            code_match = _CODE_BLOCK_RE.search(text)
+            if code_match:
+                content = code_match.group(1).strip()
+                if content.startswith('{') and content.endswith('}'):
+                    return orjson.loads(content)
         
-        return None
+        # 方法4: 从最外层（第一个）'{'处解析一个完整的JSON对象，只尝试一次，避免逐个花括号重试的二次方开销
+        start_pos = text.find('{')
+        if start_pos == -1:
+            return None
+        try:
+            parsed, _ = _JSON_DECODER.raw_decode(text, start_pos)
+            return parsed
+        except json.JSONDecodeError:
+            return None
     
     def _standardize_result(self, parsed: Dict[str, Any]) -> Dict[str, Any]:
-        """标准化解析结果"""
-        # 确保所有必需字段存在且类型正确
-        result = {
-            "brand_list": parsed.get("brand_list", []) if isinstance(parsed.get("brand_list"), list) else [],
-            "spu_list": parsed.get("spu_list", []) if isinstance(parsed.get("spu_list"), list) else [],
-            "emotion_dict": parsed.get("emotion_dict", {}) if isinstance(parsed.get("emotion_dict"), dict) else {},
-            "evaluation_dict": parsed.get("evaluation_dict", {}) if isinstance(parsed.get("evaluation_dict"), dict) else {}
-        }
+        """标准化解析结果（一次遍历生成新字典，不修改LLM解析出的原始对象）"""
+        brand_list = parsed.get("brand_list")
+        spu_list = parsed.get("spu_list")
+        emotion_dict = parsed.get("emotion_dict")
+        evaluation_dict = parsed.get("evaluation_dict")
         
-        # 标准化情感标签
-        emotion_mapping = {
-            "positive": "正向", "正面": "正向", "好": "正向", "积极": "正向",
-            "negative": "负向", "负面": "负向", "差": "负向", "消极": "负向",
-            "neutral": "中立", "一般": "中立", "普通": "中立", "客观": "中立"
+        # 确保所有必需字段存在且类型正确，同时标准化情感标签、确保评价词是列表
+        result = {
+            "brand_list": brand_list if isinstance(brand_list, list) else [],
+            "spu_list": spu_list if isinstance(spu_list, list) else [],
+            "emotion_dict": {
+                key: _EMOTION_MAP.get(emotion) or (emotion if emotion in _VALID_EMOTIONS else "中立")
+                for key, emotion in emotion_dict.items()
+            } if isinstance(emotion_dict, dict) else {},
+            "evaluation_dict": {
+                key: evaluations if isinstance(evaluations, list) else [evaluations] if isinstance(evaluations, str) else []
+                for key, evaluations in evaluation_dict.items()
+            } if isinstance(evaluation_dict, dict) else {},
         }
         
-        for key, emotion in result["emotion_dict"].items():
-            if emotion in emotion_mapping:
-                result["emotion_dict"][key] = emotion_mapping[emotion]
-            elif emotion not in ["正向", "负向", "中立"]:
-                result["emotion_dict"][key] = "中立"
-        
-        # 确保评价词是列表
-        for key, evaluations in result["evaluation_dict"].items():
-            if not isinstance(evaluations, list):
-                result["evaluation_dict"][key] = [evaluations] if isinstance(evaluations, str) else []
-        
         return result
     
     def _create_error_result(self, error_type: str, error_message: str) -> Dict[str, Any]:
@@ -1,20 +1,27 @@
 import os
-import json
 import glob
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from crewai.tools import BaseTool
 import logging
 from datetime import datetime
 
 # 导入品牌标准化工具
 from .brand_normalizer import get_brand_normalizer
-from ..store import SupabaseDatabase, FileManager
+from ..store import get_database, FileManager
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 互动量由这四项相加
+ENGAGEMENT_COLUMNS = ['liked_count', 'collected_count', 'comment_count', 'share_count']
+# SOV分档位：档位名 -> 排名上限（档位逐级包含）
+TIER_LIMITS = {'top20': 20, 'top50': 50, 'top100': 100}
+# SOV计算只需读取宽表中的这些列
+SOV_INPUT_COLUMNS = ['rank', 'brand_list', 'has_brand_info'] + ENGAGEMENT_COLUMNS
+
 class SOVCalculatorTool:
     """SOV计算工具 - 计算各品牌在关键词下的声量占比（Share of Voice）"""
     name: str = "sov_calculator"
@@ -27,7 +34,7 @@ class SOVCalculatorTool:
         self.brand_normalizer = get_brand_normalizer()
         
         # 初始化数据库连接和文件管理器
-        self.db = SupabaseDatabase()
+        self.db = get_database()
         self.file_manager = FileManager()
     
     def _run(self, keyword: str, input_data_dir: str = "data/export", output_data_dir: str = "outputs", method: str = "weighted") -> str:
@@ -54,7 +61,7 @@ class SOVCalculatorTool:
                 return f"未找到关键词 '{keyword}' 的数据文件，请先使用DataMergerTool生成宽表数据"
             
             # 2. 读取CSV数据
-            df = pd.read_csv(csv_file)
+            df = self._read_sov_input(csv_file)
             logger.info(f"[SOVCalculatorTool] 读取数据文件: {csv_file}, 记录数: {len(df)}")
             
             # 3. 数据预处理
@@ -87,202 +94,234 @@ class SOVCalculatorTool:
     
     def _find_csv_file(self, keyword: str, data_dir: str) -> Optional[str]:
         """查找指定关键词的最新CSV文件"""
-        pattern = f"{data_dir}/{keyword}/merged_data_*.csv"
-        files = self.file_manager.find_files_by_pattern(pattern)
-        
-        if not files:
+        # 单次扫描关键词目录，返回最新的merged_data_*.csv
+        latest_file = self.file_manager.find_latest_file_in_dir(
+            self.file_manager.build_path(data_dir, keyword), prefix="merged_data_", suffix=".csv"
+        )
+        if not latest_file:
             return None
         
-        # 返回最新的文件
-        latest_file = self.file_manager.find_latest_file(files)
         logger.info(f"[SOVCalculatorTool] 找到数据文件: {latest_file}")
         return latest_file
     
+    def _read_sov_input(self, csv_file: str) -> pd.DataFrame:
+        """只读取SOV计算用到的列；早期生成的宽表缺少互动量列时按0补齐"""
+        header = self.file_manager.read_csv(csv_file, nrows=0).columns
+        usecols = [col for col in SOV_INPUT_COLUMNS if col in header]
+        df = self.file_manager.read_csv(csv_file, engine='pyarrow', usecols=usecols)
+        
+        missing_columns = [col for col in ENGAGEMENT_COLUMNS if col not in df.columns]
+        if missing_columns:
+            logger.warning(f"[SOVCalculatorTool] 数据文件缺少互动量列 {missing_columns}，按0处理")
+            df[missing_columns] = 0
+        return df
+    
     def _preprocess_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """数据预处理"""
-        # 只保留有品牌信息的记录
-        df_valid = df[df['has_brand_info'] == True].copy()
+        # 只保留有品牌信息且落在最大档位内的记录（排名缺失的记录按0处理，仍然保留）
+        max_tier_limit = max(TIER_LIMITS.values())
+        ranks = pd.to_numeric(df['rank'], errors='coerce')
+        df_valid = df[(df['has_brand_info'] == True) & ~(ranks > max_tier_limit)]
         
-        logger.info(f"[SOVCalculatorTool] 数据预处理: 原始记录 {len(df)} 条，有品牌信息 {len(df_valid)} 条")
+        logger.info(f"[SOVCalculatorTool] 数据预处理: 原始记录 {len(df)} 条，前{max_tier_limit}名内有品牌信息 {len(df_valid)} 条")
         
-        # 处理brand_list字段
-        expanded_records = []
+        # 没有可用记录或品牌列表全为空时直接返回，不再解析和展开
+        if df_valid.empty or not df_valid['brand_list'].notna().any():
+            logger.warning("[SOVCalculatorTool] 没有有效的品牌数据")
+            return pd.DataFrame()
         
-        for _, row in df_valid.iterrows():
-            try:
-                brand_list_str = row['brand_list']
-
-                if pd.isna(brand_list_str) or brand_list_str == '':
-                    continue
-                
-                # 解析品牌列表 - 处理可能的双重JSON编码
-                if isinstance(brand_list_str, str):
-                    brands = self.file_manager.parse_json_string(brand_list_str)
-                    
-                    # 处理双重编码的情况
-                    if isinstance(brands, str):
-                        try:
-                            brands = self.file_manager.parse_json_string(brands)
-                            logger.debug(f"双重解码成功: {brands}")
-                        except (json.JSONDecodeError, TypeError):
-                            logger.warning(f"双重解码失败: {brands}")
-                            continue
-                            
-                else:
-                    brands = brand_list_str
-                
-                if not isinstance(brands, list):
-                    continue
-                if len(brands) == 0:
-                    continue
-
-                #logger.info(f"[SOVCalculatorTool] rank: {row['rank']}，brands:  {brands}")
-        
-                # 为每个品牌创建一条记录
-                for brand in brands:
-                    if brand and brand.strip():
-                        # 标准化品牌名
-                        brand_normalizer = self.brand_normalizer
-                        normalized_brand = brand_normalizer.normalize_brand_name(brand.strip())
-                        
-                        if normalized_brand:  # 只有标准化后不为空的品牌名才处理
-                            # 将pandas Series转换为字典，然后添加brand字段
-                            record = row.to_dict()
-                            record['brand'] = normalized_brand
-                            record['original_brand'] = brand.strip()  # 保留原始品牌名用于调试
-                            expanded_records.append(record)
-                        
-            except (json.JSONDecodeError, TypeError) as e:
-                logger.warning(f"解析品牌列表失败: {e}, 数据: {row['brand_list']}")
-                continue
+        # 解析brand_list（相同的JSON字符串只解析一次），再按品牌展开为多行
+        parsed_cache: Dict[str, list] = {}
         
-        if not expanded_records:
+        def parse_cached(value: Any) -> list:
+            if not isinstance(value, str):
+                return self._parse_brand_list(value)
+            if value not in parsed_cache:
+                parsed_cache[value] = self._parse_brand_list(value)
+            return parsed_cache[value]
+        
+        brand_lists = df_valid['brand_list'].map(parse_cached)
+        expanded_df = df_valid.assign(original_brand=brand_lists).explode('original_brand')
+        
+        # 去除空品牌名后标准化，只保留标准化后不为空的品牌
+        expanded_df['original_brand'] = expanded_df['original_brand'].str.strip()  # 保留原始品牌名用于调试
+        expanded_df = expanded_df[expanded_df['original_brand'].fillna('') != '']
+        brand_lookup = self.brand_normalizer.build_lookup_table(set(expanded_df['original_brand'].unique()))  # 每个品牌名只标准化一次
+        expanded_df['brand'] = expanded_df['original_brand'].map(brand_lookup)
+        expanded_df = expanded_df[expanded_df['brand'] != '']
+        
+        if expanded_df.empty:
             logger.warning("[SOVCalculatorTool] 没有有效的品牌数据")
             return pd.DataFrame()
         
-        expanded_df = pd.DataFrame(expanded_records)
+        base_columns = [col for col in df_valid.columns if col not in ('brand', 'original_brand')]
+        expanded_df = expanded_df[base_columns + ['brand', 'original_brand']].reset_index(drop=True)
         
         # 填充缺失值
-        numeric_columns = ['liked_count', 'collected_count', 'comment_count', 'share_count', 'rank']
-        for col in numeric_columns:
-            if col in expanded_df.columns:
-                expanded_df[col] = pd.to_numeric(expanded_df[col], errors='coerce').fillna(0)
+        numeric_columns = [col for col in ENGAGEMENT_COLUMNS + ['rank'] if col in expanded_df.columns]
+        expanded_df[numeric_columns] = expanded_df[numeric_columns].apply(pd.to_numeric, errors='coerce').fillna(0)
+        
+        # 品牌名重复度高，转为category后分组统计直接使用整数编码
+        expanded_df['brand'] = expanded_df['brand'].astype('category')
         
         logger.info(f"[SOVCalculatorTool] 展开后的品牌记录: {len(expanded_df)} 条，涉及品牌: {expanded_df['brand'].nunique()} 个")
         #ogger.info(f"[SOVCalculatorTool] 展开后的品牌记录: {expanded_df.head(10)}")
 
         return expanded_df
     
-    def _calculate_simple_sov(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def _parse_brand_list(self, brand_list_value: Any) -> list:
+        """解析单元格中的品牌列表（兼容双重JSON编码），无法解析或为空时返回空列表"""
+        if isinstance(brand_list_value, str):
+            brands = self.file_manager.parse_json_string(brand_list_value)
+            # 处理双重编码的情况
+            if isinstance(brands, str):
+                brands = self.file_manager.parse_json_string(brands)
+        elif isinstance(brand_list_value, list):
+            brands = brand_list_value
+        else:
+            return []
+        
+        return brands if isinstance(brands, list) else []
+    
+    def _aggregate_brand_tiers(self, df: pd.DataFrame, with_engagement: bool = False) -> Tuple[pd.Index, Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        一次遍历统计各品牌在每个档位内的聚合值
+        
+        档位逐级包含（top20 ⊂ top50 ⊂ top100），先按每条记录所在的最小档位分桶累加，
+        再沿档位方向做累积和，即得到各档位的统计结果，不必对每个档位重新筛选和分组
+        
+        Args:
+            df: 预处理后的品牌记录
+            with_engagement: 是否统计互动量（需要四项互动数列）
+            
+        Returns:
+            (品牌名（已排序）, 品牌×档位的统计矩阵, 各档位的总计)
+        """
+        tier_limits = np.fromiter(TIER_LIMITS.values(), dtype=np.float64)
+        n_tiers = len(tier_limits)
+        n_buckets = n_tiers + 1  # 最后一个桶存放超出所有档位的记录
+        
+        ranks = df['rank'].to_numpy(dtype=np.float64)
+        buckets = np.searchsorted(tier_limits, ranks, side='left')  # rank<=20 → 0, rank<=50 → 1, ...
+        codes, brands = pd.factorize(df['brand'], sort=True)
+        n_brands = len(brands)
+        cells = codes * n_buckets + buckets
+        
+        def per_brand(weights=None) -> np.ndarray:
+            sums = np.bincount(cells, weights=weights, minlength=n_brands * n_buckets)
+            return sums.reshape(n_brands, n_buckets).cumsum(axis=1)[:, :n_tiers]
+        
+        def per_tier(weights=None) -> np.ndarray:
+            return np.bincount(buckets, weights=weights, minlength=n_buckets).cumsum()[:n_tiers]
+        
+        rank_weights = 1 / (ranks + 1)  # 排名权重：排名越靠前权重越高，+1避免除零
+        
+        # 各品牌在档位内首次出现的位置，用于简单SOV中提及次数并列时保持出现顺序
+        first_seen = np.full((n_brands, n_buckets), len(df))
+        np.minimum.at(first_seen, (codes, buckets), np.arange(len(df)))
+        
+        brand_stats = {
+            'mention_count': per_brand(),
+            'first_seen': np.minimum.accumulate(first_seen, axis=1)[:, :n_tiers],
+            'rank_sum': per_brand(ranks),
+            'weighted_score': per_brand(rank_weights),
+        }
+        tier_totals = {
+            'total_records': per_tier().astype(np.int64),
+            'total_weight': per_tier(rank_weights),
+        }
+        if with_engagement:
+            engagement = df[ENGAGEMENT_COLUMNS].to_numpy().sum(axis=1)  # 总互动量（对 N×4 数组按行求和）
+            brand_stats['total_engagement'] = per_brand(engagement)
+            tier_totals['total_engagement'] = per_tier(engagement)
+        return brands, brand_stats, tier_totals
+    
+    def _calculate_simple_sov(self, brand_stats: pd.DataFrame, total_mentions: int) -> Dict[str, Any]:
         """计算简单SOV（基于笔记数量）"""
-
-        brand_counts = df['brand'].value_counts()
-        total_mentions = len(df)
-        
-        sov_data = []
-        for brand, count in brand_counts.items():
-            sov_percentage = (count / total_mentions) * 100
-            sov_data.append({
-                'brand': brand,
-                'mention_count': int(count),
-                'sov_percentage': round(sov_percentage, 2),
-                'rank': len(sov_data) + 1
-            })
+        # 按提及次数降序，并列时按首次出现顺序
+        sov_df = (
+            brand_stats.sort_values(['mention_count', 'first_seen'], ascending=[False, True])[['mention_count']]
+            .astype('int64')
+            .rename_axis('brand')
+            .reset_index()
+        )
+        sov_df['sov_percentage'] = (sov_df['mention_count'] / total_mentions * 100).round(2)
+        sov_df['rank'] = np.arange(1, len(sov_df) + 1)
 
         return {
             'method': 'simple',
-            'total_mentions': total_mentions,
-            'unique_brands': len(brand_counts),
-            'sov_data': sov_data
+            'total_mentions': int(total_mentions),
+            'unique_brands': len(sov_df),
+            'sov_data': sov_df.to_dict('records')
         }
     
-    def _calculate_weighted_sov(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """计算加权SOV（基于搜索排名加权）"""
-        # 排名权重：排名越靠前权重越高
-        # 权重公式：1 / rank (排名第1的权重最高)
-        df['rank_weight'] = 1 / (df['rank'] + 1)  # +1避免除零
-        
-        brand_weighted_scores = df.groupby('brand')['rank_weight'].sum()
-        total_weight = df['rank_weight'].sum()
-        
-        sov_data = []
-        for brand, weight in brand_weighted_scores.sort_values(ascending=False).items():
-            sov_percentage = (weight / total_weight) * 100
-            mention_count = len(df[df['brand'] == brand])
-            avg_rank = df[df['brand'] == brand]['rank'].mean()
-            
-            sov_data.append({
-                'brand': brand,
-                'mention_count': mention_count,
-                'weighted_score': round(weight, 4),
-                'sov_percentage': round(sov_percentage, 2),
-                'avg_rank': round(avg_rank, 2),
-                'rank': len(sov_data) + 1
-            })
+    def _calculate_weighted_sov(self, brand_stats: pd.DataFrame, total_weight: float) -> Dict[str, Any]:
+        """计算加权SOV（基于搜索排名加权，权重为 1 / (rank + 1)）"""
+        sov_df = pd.DataFrame({
+            'mention_count': brand_stats['mention_count'].astype('int64'),
+            'weighted_score': brand_stats['weighted_score'],
+            'avg_rank': brand_stats['rank_sum'] / brand_stats['mention_count'],
+        }).sort_values('weighted_score', ascending=False).rename_axis('brand').reset_index()
+        sov_df['sov_percentage'] = (sov_df['weighted_score'] / total_weight * 100).round(2)
+        sov_df['weighted_score'] = sov_df['weighted_score'].round(4)
+        sov_df['avg_rank'] = sov_df['avg_rank'].round(2)
+        sov_df['rank'] = np.arange(1, len(sov_df) + 1)
+        sov_df = sov_df[['brand', 'mention_count', 'weighted_score', 'sov_percentage', 'avg_rank', 'rank']]
         
         return {
             'method': 'weighted',
             'total_weight': round(total_weight, 4),
-            'unique_brands': len(brand_weighted_scores),
-            'sov_data': sov_data
+            'unique_brands': len(sov_df),
+            'sov_data': sov_df.to_dict('records')
         }
     
-    def _calculate_engagement_sov(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def _calculate_engagement_sov(self, brand_stats: pd.DataFrame, total_engagement: float) -> Dict[str, Any]:
         """计算互动量加权SOV"""
-        # 计算总互动量
-        df['total_engagement'] = (
-            df['liked_count'] + 
-            df['collected_count'] + 
-            df['comment_count'] + 
-            df['share_count']
-        )
-        
-        brand_engagement = df.groupby('brand').agg({
-            'total_engagement': 'sum',
-            'brand': 'count',  # 笔记数量
-            'rank': 'mean'     # 平均排名
-        }).rename(columns={'brand': 'mention_count'})
-        
-        total_engagement = df['total_engagement'].sum()
-        
-        sov_data = []
-        for brand, row in brand_engagement.sort_values('total_engagement', ascending=False).iterrows():
-            sov_percentage = (row['total_engagement'] / total_engagement) * 100 if total_engagement > 0 else 0
-            
-            sov_data.append({
-                'brand': brand,
-                'mention_count': int(row['mention_count']),
-                'total_engagement': int(row['total_engagement']),
-                'avg_engagement_per_note': round(row['total_engagement'] / row['mention_count'], 2),
-                'sov_percentage': round(sov_percentage, 2),
-                'avg_rank': round(row['rank'], 2),
-                'rank': len(sov_data) + 1
-            })
+        sov_df = pd.DataFrame({
+            'mention_count': brand_stats['mention_count'].astype('int64'),  # 笔记数量
+            'total_engagement': brand_stats['total_engagement'],
+            'avg_rank': brand_stats['rank_sum'] / brand_stats['mention_count'],  # 平均排名
+        }).sort_values('total_engagement', ascending=False).rename_axis('brand').reset_index()
+        sov_df['avg_engagement_per_note'] = (sov_df['total_engagement'] / sov_df['mention_count']).round(2)
+        if total_engagement > 0:
+            sov_df['sov_percentage'] = (sov_df['total_engagement'] / total_engagement * 100).round(2)
+        else:
+            sov_df['sov_percentage'] = 0
+        sov_df['total_engagement'] = sov_df['total_engagement'].astype('int64')
+        sov_df['avg_rank'] = sov_df['avg_rank'].round(2)
+        sov_df['rank'] = np.arange(1, len(sov_df) + 1)
+        sov_df = sov_df[['brand', 'mention_count', 'total_engagement', 'avg_engagement_per_note',
+                         'sov_percentage', 'avg_rank', 'rank']]
         
         return {
             'method': 'engagement',
             'total_engagement': int(total_engagement),
-            'unique_brands': len(brand_engagement),
-            'sov_data': sov_data
+            'unique_brands': len(sov_df),
+            'sov_data': sov_df.to_dict('records')
         }
     
     def _calculate_tiered_sov(self, df: pd.DataFrame, method: str) -> Dict[str, Any]:
-        """分档位计算SOV（top20、top50、top100）"""
-        tiers = {
-            'top20': 20,
-            'top50': 50, 
-            'top100': 100
+        """分档位计算SOV（top20、top50、top100），各档位的品牌统计一次算出"""
+        # 计算方法在整个调用内不变，先选定计算函数及其对应的分母
+        sov_calculators = {
+            "simple": (self._calculate_simple_sov, 'total_records'),
+            "weighted": (self._calculate_weighted_sov, 'total_weight'),
+            "engagement": (self._calculate_engagement_sov, 'total_engagement'),
         }
+        if method not in sov_calculators:
+            raise ValueError(f"不支持的计算方法: {method}")
+        calculate_sov, total_key = sov_calculators[method]
+        
+        brands, brand_stats, tier_totals = self._aggregate_brand_tiers(df, with_engagement=(method == "engagement"))
         
         tier_results = {}
         
-        for tier_name, tier_limit in tiers.items():
+        for tier_index, (tier_name, tier_limit) in enumerate(TIER_LIMITS.items()):
             logger.info(f"[SOVCalculatorTool] 计算 {tier_name} SOV...")
             
-            # 筛选对应档位的数据
-            tier_df = df[df['rank'] <= tier_limit].copy()
+            total_records = int(tier_totals['total_records'][tier_index])
             
-            if tier_df.empty:
+            if total_records == 0:
                 logger.warning(f"[SOVCalculatorTool] {tier_name} 档位没有数据")
                 tier_results[tier_name] = {
                     'method': method,
@@ -294,64 +333,72 @@ class SOVCalculatorTool:
                 }
                 continue
             
-            # 根据方法计算SOV
-            if method == "simple":
-                sov_result = self._calculate_simple_sov(tier_df)
-            elif method == "weighted":
-                sov_result = self._calculate_weighted_sov(tier_df)
-            elif method == "engagement":
-                sov_result = self._calculate_engagement_sov(tier_df)
-            else:
-                raise ValueError(f"不支持的计算方法: {method}")
+            # 取出该档位内出现过的品牌的统计值
+            present = brand_stats['mention_count'][:, tier_index] > 0
+            tier_stats = pd.DataFrame(
+                {name: values[present, tier_index] for name, values in brand_stats.items()},
+                index=brands[present],
+            )
+            
+            sov_result = calculate_sov(tier_stats, tier_totals[total_key][tier_index])
             
             # 添加档位信息
             sov_result['tier'] = tier_name
             sov_result['tier_limit'] = tier_limit
-            sov_result['total_records'] = len(tier_df)
+            sov_result['total_records'] = total_records
             
             tier_results[tier_name] = sov_result
             
-            logger.info(f"[SOVCalculatorTool] {tier_name} SOV计算完成，记录数: {len(tier_df)}, 品牌数: {sov_result['unique_brands']}")
+            logger.info(f"[SOVCalculatorTool] {tier_name} SOV计算完成，记录数: {total_records}, 品牌数: {sov_result['unique_brands']}")
         
         return tier_results
     
+    def _build_sov_frame(self, tier_results: Dict[str, Any]) -> pd.DataFrame:
+        """将各档位的sov_data合并为一个DataFrame，档位信息按列整体赋值（跳过元数据和无数据的档位）"""
+        tier_frames = []
+        
+        for tier_name, tier_data in tier_results.items():
+            if tier_name == 'metadata':
+                continue
+            
+            if not tier_data.get('sov_data'):
+                logger.warning(f"[SOVCalculatorTool] {tier_name} 档位没有SOV数据，跳过")
+                continue
+            
+            tier_frames.append(pd.DataFrame(tier_data['sov_data']).assign(
+                tier=tier_name,
+                tier_limit=tier_data['tier_limit'],
+                total_records=tier_data['total_records'],
+                unique_brands=tier_data['unique_brands'],
+            ))
+        
+        if not tier_frames:
+            return pd.DataFrame()
+        return pd.concat(tier_frames, ignore_index=True)
+    
     def _save_tiered_sov_results(self, tier_results: Dict[str, Any], keyword: str, method: str, data_dir: str) -> str:
         """保存分档位SOV计算结果到CSV"""
         # 确保输出目录存在
         output_dir = self.file_manager.build_path(data_dir, keyword)
         self.file_manager.ensure_directory(output_dir)
         
-        # 生成时间戳
-        timestamp = datetime.now().strftime("%Y%m%d")
+        # 生成时间戳（文件名、CSV和JSON元数据共用同一计算时间）
+        calculated_at = datetime.now()
+        timestamp = calculated_at.strftime("%Y%m%d")
         
         result_files = []
         
         # 合并所有档位的数据到一个CSV文件
-        all_sov_data = []
+        sov_df = self._build_sov_frame(tier_results)
         
-        for tier_name, tier_data in tier_results.items():
-            if not tier_data.get('sov_data'):
-                logger.warning(f"[SOVCalculatorTool] {tier_name} 档位没有SOV数据，跳过")
-                continue
-            
-            # 为每条记录添加档位信息
-            for sov_record in tier_data['sov_data']:
-                record = sov_record.copy()
-                record['keyword'] = keyword
-                record['method'] = method
-                record['tier'] = tier_name
-                record['tier_limit'] = tier_data['tier_limit']
-                record['total_records'] = tier_data['total_records']
-                record['calculated_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                all_sov_data.append(record)
-        
-        if all_sov_data:
+        if not sov_df.empty:
             # CSV文件名
             csv_filename = f"SOV_all_tiers_{method}_{timestamp}.csv"
             csv_filepath = self.file_manager.build_path(output_dir, csv_filename)
             
-            # 创建DataFrame
-            sov_df = pd.DataFrame(all_sov_data)
+            sov_df['keyword'] = keyword
+            sov_df['method'] = method
+            sov_df['calculated_at'] = calculated_at.strftime("%Y-%m-%d %H:%M:%S")
             
             # 重新排列列顺序
             columns_order = ['keyword', 'method', 'tier', 'tier_limit', 'rank', 'brand', 'mention_count', 'sov_percentage']
@@ -382,7 +429,7 @@ class SOVCalculatorTool:
         tier_results['metadata'] = {
             'keyword': keyword,
             'method': method,
-            'calculated_at': datetime.now().isoformat(),
+            'calculated_at': calculated_at.isoformat(),
             'tool_version': '2.0'
         }
         
@@ -475,12 +522,15 @@ class SOVCalculatorTool:
             report_lines.append("📊 档位对比分析:")
             report_lines.append("-" * 60)
             
+            # 按档位建立 品牌 -> SOV记录 的索引，避免逐个品牌遍历各档位的sov_data
+            tier_index = {
+                tier_name: {item['brand']: item for item in tier_data['sov_data']}
+                for tier_name, tier_data in tier_results.items()
+                if isinstance(tier_data, dict) and 'sov_data' in tier_data
+            }
+            
             # 找出在所有档位都出现的品牌
-            all_brands = set()
-            for tier_data in tier_results.values():
-                if isinstance(tier_data, dict) and 'sov_data' in tier_data:
-                    for item in tier_data['sov_data']:
-                        all_brands.add(item['brand'])
+            all_brands = set().union(*tier_index.values())
             
             # 显示主要品牌在不同档位的表现
             main_brands = list(all_brands)[:5]  # 取前5个品牌进行对比
@@ -488,12 +538,9 @@ class SOVCalculatorTool:
             for brand in main_brands:
                 brand_performance = []
                 for tier_name in ['top20', 'top50', 'top100']:
-                    if tier_name in tier_results:
-                        tier_data = tier_results[tier_name]
-                        for item in tier_data.get('sov_data', []):
-                            if item['brand'] == brand:
-                                brand_performance.append(f"{tier_name}: {item['sov_percentage']:.2f}%")
-                                break
+                    item = tier_index.get(tier_name, {}).get(brand)
+                    if item:
+                        brand_performance.append(f"{tier_name}: {item['sov_percentage']:.2f}%")
                 
                 if brand_performance:
                     report_lines.append(f"   {brand}: {' | '.join(brand_performance)}")
@@ -508,44 +555,31 @@ class SOVCalculatorTool:
         try:
             logger.info(f"[SOVCalculatorTool] 开始写入SOV结果到数据库...")
             
-            # 准备要插入的数据
-            data_to_insert = []
+            # 准备要插入的数据：按列统一填充缺失值和转换类型，再转为记录列表
+            sov_df = self._build_sov_frame(tier_results)
             
-            for tier_name, tier_data in tier_results.items():
-                if tier_name == 'metadata':  # 跳过元数据
-                    continue
-                    
-                if not tier_data.get('sov_data'):
-                    logger.warning(f"[SOVCalculatorTool] {tier_name} 档位没有SOV数据，跳过写入")
-                    continue
-                
-                for sov_item in tier_data['sov_data']:
-                    record = {
-                        "keyword": self.db.safe_str(keyword),
-                        "tier_limit": self.db.safe_int(tier_data.get('tier_limit')),
-                        "brand": self.db.safe_str(sov_item.get('brand')),
-                        "rank": self.db.safe_int(sov_item.get('rank')),
-                        "sov_percentage": self.db.safe_float(sov_item.get('sov_percentage')),
-                        "mention_count": self.db.safe_int(sov_item.get('mention_count')),
-                        "total_records": self.db.safe_int(tier_data.get('total_records')),
-                        "unique_brands": self.db.safe_int(tier_data.get('unique_brands')),
-                    }
-                    
-                    # 根据计算方法添加特定字段
-                    if method == 'weighted':
-                        record["weighted_score"] = self.db.safe_float(sov_item.get('weighted_score'))
-                        record["avg_rank"] = self.db.safe_float(sov_item.get('avg_rank'))
-                    elif method == 'engagement':
-                        record["total_engagement"] = self.db.safe_int(sov_item.get('total_engagement'))
-                        record["avg_engagement_per_note"] = self.db.safe_float(sov_item.get('avg_engagement_per_note'))
-                        record["avg_rank"] = self.db.safe_float(sov_item.get('avg_rank'))
-                    
-                    data_to_insert.append(record)
-            
-            if not data_to_insert:
+            if sov_df.empty:
                 return "❌ 没有SOV数据需要写入数据库"
             
-            # 使用统一的数据库接口批量插入
+            int_columns = ['tier_limit', 'rank', 'mention_count', 'total_records', 'unique_brands']
+            float_columns = ['sov_percentage']
+            
+            # 根据计算方法添加特定字段
+            if method == 'weighted':
+                float_columns += ['weighted_score', 'avg_rank']
+            elif method == 'engagement':
+                int_columns += ['total_engagement']
+                float_columns += ['avg_engagement_per_note', 'avg_rank']
+            
+            records_df = pd.DataFrame({
+                'keyword': self.db.safe_str(keyword),
+                'brand': sov_df['brand'].fillna('').astype(str),
+            })
+            records_df[int_columns] = sov_df[int_columns].apply(pd.to_numeric, errors='coerce').fillna(0).astype('int64')
+            records_df[float_columns] = sov_df[float_columns].apply(pd.to_numeric, errors='coerce').fillna(0.0).astype('float64')
+            data_to_insert = records_df.to_dict(orient='records')
+            
+            # 使用统一的数据库接口批量插入（按块分批请求）
             result = self.db.batch_insert_sov_data(data_to_insert)
             
             if result['success']:
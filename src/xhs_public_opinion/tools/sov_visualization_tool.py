@@ -20,7 +20,7 @@ import warnings
 import matplotlib.font_manager as fm
 from pydantic import BaseModel, Field
 
-from ..store import SupabaseDatabase, FileManager
+from ..store import get_database, FileManager
     
 # 设置中文字体和样式 - 改进字体配置
 def setup_chinese_fonts():
@@ -55,6 +55,11 @@ chinese_font = setup_chinese_fonts()
 plt.rcParams['font.sans-serif'] = [chinese_font, 'DejaVu Sans']
 plt.rcParams['axes.unicode_minus'] = False
 plt.rcParams['font.size'] = 10
+# 中文字体属性只构造一次，matplotlib设置到Text时会自行复制
+chinese_font_properties = fm.FontProperties(family=chinese_font)
+
+# 周报PNG的输出分辨率（24x12英寸画布，150dpi已足够清晰，光栅化和写盘开销约为300dpi的1/4）
+CHART_DPI = 150
 
 # 设置样式
 try:
@@ -78,7 +83,7 @@ class SOVVisualizationTool:
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # 初始化数据库连接
-        self.db = SupabaseDatabase()
+        self.db = get_database()
         self.file_manager = FileManager()
     
     def _run(self, keyword: str, 
@@ -131,27 +136,15 @@ class SOVVisualizationTool:
                 if raw_data:
                     df = pd.DataFrame(raw_data)
                     df['created_at'] = pd.to_datetime(df['created_at'])
-                    df['date'] = df['created_at'].dt.date
-          
-                    unique_dates = sorted(df['date'].unique(), reverse=True)
-
-                    # logger.info(f"[SOVVisualization] 档位: {t}, 日期: {unique_dates}")
-                    
-                    if len(unique_dates) >= 1:
-                        # 最新日期的数据
-                        current_date = unique_dates[0]
-                        current_df = df[df['date'] == current_date]
-                        current_df = current_df.sort_values('sov_percentage', ascending=False)
-                        current_data[t] = current_df.head(10).to_dict('records')
-             
+                    # 保持datetime64按天截断，避免生成Python date对象
+                    df['date'] = df['created_at'].dt.normalize()
+                    # 数据库返回的数值可能为字符串或空值，转为数值后才能按SOV选取前10
+                    df['sov_percentage'] = pd.to_numeric(df['sov_percentage'], errors='coerce')
                     
-                    if len(unique_dates) >= 2:
-                        # 第二新日期的数据
-                        previous_date = unique_dates[1]
-                        previous_df = df[df['date'] == previous_date]
-                        previous_df = previous_df.sort_values('sov_percentage', ascending=False)
-                        previous_data[t] = previous_df.head(10).to_dict('records')
-                  
+                    # 最新日期为当期数据，第二新日期为上期数据，各取SOV前10
+                    unique_dates = df['date'].drop_duplicates().sort_values(ascending=False)
+                    for tier_data, date in zip((current_data, previous_data), unique_dates.iloc[:2]):
+                        tier_data[t] = df[df['date'] == date].nlargest(10, 'sov_percentage').to_dict('records')
             
             # 返回所有档位的数据字典
             return current_data, previous_data if previous_data else None
@@ -177,7 +170,7 @@ class SOVVisualizationTool:
         # 设置图表标题（降低位置避免重叠）
         fig.suptitle(f'【{keyword}】品牌SOV分析', 
                     fontsize=20, fontweight='bold', y=0.93,
-                    fontproperties=fm.FontProperties(family=chinese_font))
+                    fontproperties=chinese_font_properties)
         
         tiers = ["20", "50", "100"]
         tier_names = ["TOP20", "TOP50", "TOP100"]
@@ -196,9 +189,9 @@ class SOVVisualizationTool:
                 # 无数据时显示提示
                 ax.text(0.5, 0.5, f'暂无{tier_name}数据', ha='center', va='center', 
                        fontsize=16, transform=ax.transAxes,
-                       fontproperties=fm.FontProperties(family=chinese_font))
+                       fontproperties=chinese_font_properties)
                 ax.set_title(tier_name, fontsize=16, fontweight='bold',
-                           fontproperties=fm.FontProperties(family=chinese_font))
+                           fontproperties=chinese_font_properties)
         
         # 添加整体说明
         self._add_three_tier_annotations(fig, keyword, current_data, previous_data)
@@ -209,7 +202,8 @@ class SOVVisualizationTool:
         chart_path = self.file_manager.build_path(chart_dir, chart_filename)
         
         # 不使用tight_layout，因为我们已经手动调整了布局
-        plt.savefig(chart_path, dpi=300, bbox_inches='tight', facecolor='white', edgecolor='none')
+        plt.savefig(chart_path, dpi=CHART_DPI, bbox_inches='tight', facecolor='white', edgecolor='none',
+                    pil_kwargs={'optimize': True})
         plt.close()
         
         logger.info(f"图表已保存: {chart_path}")
@@ -222,7 +216,7 @@ class SOVVisualizationTool:
         if not current_data:
             ax.text(0.5, 0.5, '暂无数据', ha='center', va='center', 
                    fontsize=16, transform=ax.transAxes,
-                   fontproperties=fm.FontProperties(family=chinese_font))
+                   fontproperties=chinese_font_properties)
             return
         
         # 提取品牌和SOV数据
@@ -237,26 +231,12 @@ class SOVVisualizationTool:
         previous_dict = {item['brand']: float(item['sov_percentage']) 
                         for item in previous_data} if previous_data else {}
         
-        changes = []
-        trends = []
+        previous_sov = np.array([previous_dict.get(brand, np.nan) for brand in brands], dtype=float)
+        changes = np.asarray(sov_values, dtype=float) - previous_sov  # 保持为数值类型，不转换为字符串
+        is_new = np.isnan(previous_sov)  # 上期未上榜的新品牌
         
-        for brand, current_sov in zip(brands, sov_values):
-            if brand in previous_dict:
-                previous_sov = previous_dict[brand]
-                change = current_sov - previous_sov  # 保持为数值类型，不转换为字符串
-                changes.append(change)
-                
-                # 确定趋势箭头
-                if change > 0.1:
-                    trends.append('↑')
-                elif change < -0.1:
-                    trends.append('↓')
-                else:
-                    trends.append('→')
-                
-            else:
-                changes.append(None)  # 新品牌
-                trends.append('🆕')
+        # 确定趋势箭头
+        trends = np.where(is_new, '🆕', np.where(changes > 0.1, '↑', np.where(changes < -0.1, '↓', '→')))
         
   
         # 生成颜色 - 使用渐变色而非硬编码
@@ -280,7 +260,7 @@ class SOVVisualizationTool:
             brand_labels.append(f"{i+1}. {brand}")
         
         ax.set_yticklabels(brand_labels, fontsize=10, 
-                          fontproperties=fm.FontProperties(family=chinese_font))
+                          fontproperties=chinese_font_properties)
         
         # 为目标品牌的标签单独设置加粗样式
         if target_brand:
@@ -291,16 +271,16 @@ class SOVVisualizationTool:
         
         # 添加SOV数值标签
         max_sov = max(sov_values) if sov_values else 1
-        for i, (bar, sov, change, trend) in enumerate(zip(bars, sov_values, changes, trends)):
+        for i, (bar, sov, change, trend, new_brand) in enumerate(zip(bars, sov_values, changes, trends, is_new)):
             width = bar.get_width()
             
             # SOV标签
             ax.text(width + max_sov * 0.01, bar.get_y() + bar.get_height()/2, 
                    f'{sov:.1f}', ha='left', va='center', fontsize=9, fontweight='bold',
-                   fontproperties=fm.FontProperties(family=chinese_font))
+                   fontproperties=chinese_font_properties)
             
             # 环比变化标签
-            if change is not None:
+            if not new_brand:
                 # 趋势箭头
                 trend_color = '#FF4444' if trend == '↑' else '#44AA44' if trend == '↓' else '#888888'
                 ax.text(width + max_sov * 0.15, bar.get_y() + bar.get_height()/2, 
@@ -323,9 +303,9 @@ class SOVVisualizationTool:
         
         # 设置图表样式 - 明确指定字体
         ax.set_xlabel('SOV (%)', fontsize=11, 
-                     fontproperties=fm.FontProperties(family=chinese_font))
+                     fontproperties=chinese_font_properties)
         ax.set_title(f'{tier_name} SOV排名', fontsize=14, fontweight='bold', pad=10,
-                    fontproperties=fm.FontProperties(family=chinese_font))
+                    fontproperties=chinese_font_properties)
         ax.set_xlim(0, max_sov * 1.35)  # 减少右边距，为环比数据留空间
         ax.invert_yaxis()
         
@@ -385,10 +365,10 @@ class SOVVisualizationTool:
         # 主要说明文字放在底部留白区域
         fig.text(0.5, 0.08, annotation_text, ha='center', va='center', 
                 fontsize=11, style='italic', wrap=True,
-                fontproperties=fm.FontProperties(family=chinese_font),
+                fontproperties=chinese_font_properties,
                 bbox=dict(boxstyle="round,pad=0.5", facecolor='lightyellow', alpha=0.8))
         
         # 版权信息放在最底部
         fig.text(0.5, 0.02, source_text, ha='center', va='bottom', 
                 fontsize=9, color='gray',
-                fontproperties=fm.FontProperties(family=chinese_font)) 
\ No newline at end of file
+                fontproperties=chinese_font_properties) 
\ No newline at end of file
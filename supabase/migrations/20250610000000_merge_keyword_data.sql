@@ -0,0 +1,16 @@
+-- 数据拼接工具使用的服务端RPC函数（store/database.py）
+-- 函数不存在时客户端自动回退到分步查询/本地计算，部署后可省去多次往返和本地聚合
+
+-- 关键词本周搜索结果及对应笔记详情（数据库内完成JOIN）
+-- 调用方: SupabaseDatabase.get_search_results_with_notes_by_keyword
+create or replace function merge_keyword_data(kw text, since timestamptz)
+returns table (id bigint, note_id text, search_account text, rank int,
+               created_at timestamptz, note jsonb)
+language sql stable as $$
+    select s.id::bigint, s.note_id::text, s.search_account::text, s.rank::int,
+           s.created_at::timestamptz, to_jsonb(n) as note
+    from xhs_search_result s
+    left join xhs_note n using (note_id)
+    where s.keyword = kw and s.created_at >= since
+    order by s.rank
+$$;
@@ -0,0 +1,29 @@
+-- 数据拼接工具使用的服务端RPC函数（store/database.py）
+-- 函数不存在时客户端自动回退到分步查询/本地计算，部署后可省去多次往返和本地聚合
+
+-- 关键词本周搜索结果的RRF排名，每个note_id一行
+-- 同一账户多次出现时取排名最大的一条，代表记录取排名最靠前的一条
+-- 调用方: SupabaseDatabase.get_rrf_rankings_by_keyword
+create or replace function xhs_rrf_top(kw text, since timestamptz, k int default 60, topn int default null)
+returns table (note_id text, search_id bigint, rrf_score float8, accounts text[], ranks int[],
+               data_crawler_time timestamptz)
+language sql stable as $$
+    with latest as (
+        select distinct on (note_id, search_account) note_id, search_account, rank
+        from xhs_search_result
+        where keyword = kw and created_at >= since and rank is not null
+          and coalesce(note_id, '') <> '' and coalesce(search_account, '') <> ''
+        order by note_id, search_account, rank desc, id desc
+    ), firsts as (
+        select distinct on (note_id) note_id, id as search_id, rank as first_rank, created_at
+        from xhs_search_result
+        where keyword = kw and created_at >= since and rank is not null
+        order by note_id, rank, id
+    )
+    select l.note_id::text, f.search_id::bigint, sum(1.0 / (k + l.rank))::float8 as rrf_score,
+           array_agg(l.search_account::text), array_agg(l.rank::int), f.created_at::timestamptz
+    from latest l join firsts f using (note_id)
+    group by l.note_id, f.search_id, f.first_rank, f.created_at
+    order by rrf_score desc, f.first_rank, f.search_id
+    limit topn
+$$;
@@ -0,0 +1,47 @@
+"""
+测试公共配置
+
+- 将src加入导入路径，未安装本包时也能直接运行pytest
+- crewai/openai/requests仅用于工具基类和LLM调用，被测逻辑不依赖它们；
+  未安装时注册最小占位模块，使tools包可以导入（已安装时使用真实依赖）
+"""
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+_MISSING_PACKAGES = {name for name in ("crewai", "openai", "requests") if importlib.util.find_spec(name) is None}
+
+
+def _register_stub(name: str, **attrs) -> None:
+    if name.split(".")[0] not in _MISSING_PACKAGES:
+        return
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+
+
+class _StubBaseTool:
+    def __init__(self, **kwargs):
+        pass
+
+
+_register_stub("crewai")
+_register_stub("crewai.tools", BaseTool=_StubBaseTool)
+_register_stub("openai", OpenAI=object)
+_register_stub("requests")
+
+
+@pytest.fixture(autouse=True)
+def _no_supabase_env(monkeypatch):
+    """测试中不连接真实数据库"""
+    monkeypatch.delenv("SEO_SUPABASE_URL", raising=False)
+    monkeypatch.delenv("SEO_SUPABASE_ANON_KEY", raising=False)
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from xhs_public_opinion.tools.data_merger_tool import DataMergerTool
+
+
+@pytest.fixture
+def tool():
+    return DataMergerTool()
+
+
+def _search(note_id, account, rank, record_id=0, created_at="2025-06-01"):
+    return {"id": record_id, "note_id": note_id, "search_account": account, "rank": rank, "created_at": created_at}
+
+
+def test_rrf_score_matches_formula(tool):
+    ranks = np.array([[1, np.nan], [np.nan, 2], [3, 3]], dtype=float)
+
+    scores = tool._calculate_rrf_score(ranks, k=60)
+
+    np.testing.assert_allclose(scores, [1 / 61, 1 / 62, 2 / 63])
+
+
+def test_rankings_sorted_by_rrf_score(tool):
+    search_results = [
+        _search("a", "acc1", 1, record_id=1),
+        _search("b", "acc1", 5, record_id=2),
+        _search("c", "acc1", 2, record_id=3),
+        _search("c", "acc2", 2, record_id=4),
+    ]
+
+    rankings = tool._merge_multi_account_rankings(search_results)
+
+    # c出现在两个账户中，分数高于只在单账户排第1的a
+    assert rankings.index.tolist() == ["c", "a", "b"]
+    assert rankings["rank"].tolist() == [1, 2, 3]
+    assert rankings["rrf_score"].tolist() == [round(2 / 62, 4), round(1 / 61, 4), round(1 / 65, 4)]
+    assert rankings["account_ranks"].tolist() == ["acc1:2; acc2:2", "acc1:1; acc2:N/A", "acc1:5; acc2:N/A"]
+    assert rankings["account_coverage"].tolist() == [2, 1, 1]
+    # 代表记录取该笔记的第一条搜索结果
+    assert rankings.loc["c", "search_id"] == 3
+
+
+def test_rankings_ties_keep_first_appearance_order(tool):
+    search_results = [
+        _search("late", "acc2", 3),
+        _search("x", "acc1", 3),
+        _search("y", "acc2", 1),
+        _search("early", "acc1", 1),
+    ]
+
+    rankings = tool._merge_multi_account_rankings(search_results)
+
+    # y与early同分，late与x同分：同分时按note_id首次出现的顺序
+    assert rankings.index.tolist() == ["y", "early", "late", "x"]
+
+
+def test_rankings_repeated_account_keeps_last_rank(tool):
+    search_results = [
+        _search("a", "acc1", 9),
+        _search("a", "acc1", 1),
+    ]
+
+    rankings = tool._merge_multi_account_rankings(search_results)
+
+    assert rankings.loc["a", "account_ranks"] == "acc1:1"
+    assert rankings.loc["a", "rrf_score"] == round(1 / 61, 4)
+
+
+def test_rankings_skip_invalid_records(tool):
+    search_results = [
+        _search("", "acc1", 1),
+        _search("a", None, 1),
+        _search("b", "acc1", None),
+    ]
+
+    rankings = tool._merge_multi_account_rankings(search_results)
+
+    assert rankings.empty
+
+
+def test_rankings_from_rrf_rows_match_local_merge(tool):
+    search_results = [
+        _search("a", "acc1", 1, record_id=1),
+        _search("c", "acc1", 2, record_id=3),
+        _search("c", "acc2", 2, record_id=4),
+    ]
+    local = tool._merge_multi_account_rankings(search_results)
+    rrf_rows = [
+        {"note_id": "c", "search_id": 3, "rrf_score": 2 / 62, "accounts": ["acc1", "acc2"], "ranks": [2, 2],
+         "data_crawler_time": "2025-06-01"},
+        {"note_id": "a", "search_id": 1, "rrf_score": 1 / 61, "accounts": ["acc1"], "ranks": [1],
+         "data_crawler_time": "2025-06-01"},
+    ]
+
+    remote = tool._rankings_from_rrf_rows(rrf_rows)
+
+    pd.testing.assert_frame_equal(remote, local, check_dtype=False)
+
+
+def test_statistics_account_coverage_from_rankings(tool):
+    rankings = tool._merge_multi_account_rankings([
+        _search("a", "acc1", 1),
+        _search("a", "acc2", 3),
+        _search("b", "acc2", 2),
+        _search("c", "acc1", 0),
+    ])
+    merged = rankings.reset_index().assign(
+        has_note_detail=True, has_brand_info=False, brand_list=None,
+    )
+
+    stats = tool._generate_statistics(merged, rankings, "kw")
+
+    # 排名为0视为无效排名，与account_ranks中的N/A一致
+    assert stats["account_count"] == 2
+    assert stats["avg_account_per_note"] == pytest.approx(1.0)
@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+
+from xhs_public_opinion.store.database import SupabaseDatabase
+
+
+class FakeNoteTable:
+    """模拟xhs_note表的update(...).eq(...).execute()调用链"""
+
+    def __init__(self, existing_ids, failing_ids):
+        self.existing_ids = set(existing_ids)
+        self.failing_ids = set(failing_ids)
+        self.updates = {}
+
+    def update(self, data, count=None, returning=None):
+        self._data = data
+        return self
+
+    def eq(self, column, value):
+        assert column == "note_id"
+        return _FakeUpdate(self, value, self._data)
+
+
+class _FakeUpdate:
+    def __init__(self, table, note_id, data):
+        self.table, self.note_id, self.data = table, note_id, data
+
+    def execute(self):
+        if self.note_id in self.table.failing_ids:
+            raise RuntimeError("connection reset")
+        hit = self.note_id in self.table.existing_ids
+        if hit:
+            self.table.updates[self.note_id] = self.data
+        return SimpleNamespace(data=[], count=1 if hit else 0)
+
+
+class FakeClient:
+    def __init__(self, table):
+        self._table = table
+
+    def table(self, name):
+        assert name == "xhs_note"
+        return self._table
+
+
+def _result(note_id, brand):
+    return {"note_id": note_id, "brand_list": [brand], "spu_list": [], "emotion_dict": {}, "evaluation_dict": {}}
+
+
+@pytest.fixture
+def note_table():
+    return FakeNoteTable(existing_ids={"a", "c", "d"}, failing_ids={"c"})
+
+
+@pytest.fixture
+def db(note_table):
+    database = SupabaseDatabase()
+    database.client = FakeClient(note_table)
+    return database
+
+
+def test_batch_update_reports_failed_ids(db, note_table):
+    results = [
+        _result("a", "旧"),
+        _result("b", "潘婷"),   # 不存在的笔记
+        _result("c", "多芬"),   # 写入异常
+        _result("d", "卡诗"),
+        _result("a", "新"),     # 同一笔记保留最后一条
+        {"brand_list": ["缺少note_id"]},
+    ]
+
+    write_result = db.batch_update_analysis_results(results)
+
+    assert write_result == {"success": False, "updated_count": 2, "failed_ids": ["b", "c"]}
+    assert note_table.updates["a"]["brand_list"] == ["新"]
+    assert set(note_table.updates) == {"a", "d"}
+
+
+def test_batch_update_all_written(db, note_table):
+    write_result = db.batch_update_analysis_results([_result("a", "卡诗"), _result("d", "潘婷")])
+
+    assert write_result == {"success": True, "updated_count": 2, "failed_ids": []}
+
+
+def test_batch_update_empty_payload(db):
+    assert db.batch_update_analysis_results([{"brand_list": []}]) == {
+        "success": True, "updated_count": 0, "failed_ids": [],
+    }
+
+
+def test_batch_update_without_client():
+    database = SupabaseDatabase()
+
+    write_result = database.batch_update_analysis_results([_result("a", "卡诗")])
+
+    assert write_result["success"] is False
+    assert write_result["error"]
+    assert write_result["updated_count"] == 0
+
+
+def test_update_analysis_result_without_count_is_failure(db, note_table):
+    note_table.existing_ids.clear()
+
+    assert db.update_analysis_result("a", _result("a", "卡诗")) is False
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from xhs_public_opinion.store.file_manager import CSVManager
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "note_id": ["n1", "n2", "n3"],
+        "title": ['含,逗号', '含"引号"', "多行\n文本"],
+        "brand_list": ['["卡诗","潘婷"]', "[]", ""],
+        "liked_count": [1, 20, 300],
+        "rrf_score": [0.0328, 0.0164, np.nan],
+        "has_brand_info": [True, False, True],
+    })
+
+
+def test_write_csv_arrow_round_trip(frame, tmp_path):
+    file_path = str(tmp_path / "arrow.csv")
+
+    assert CSVManager._write_csv_arrow(frame, file_path, "utf-8-sig")
+
+    raw = open(file_path, "rb").read()
+    assert raw.startswith("\ufeff".encode("utf-8"))
+    assert raw.count("\ufeff".encode("utf-8")) == 1
+    # 布尔值与to_csv一致写成True/False
+    assert b'"True"' in raw and b'"False"' in raw
+
+    result = pd.read_csv(file_path, encoding="utf-8-sig", keep_default_na=False, na_values=[""])
+    expected = pd.read_csv(
+        CSVManager.write_csv(frame, str(tmp_path / "pandas.csv")),
+        encoding="utf-8-sig", keep_default_na=False, na_values=[""],
+    )
+    pd.testing.assert_frame_equal(result, expected)
+    assert result["has_brand_info"].tolist() == [True, False, True]
+    assert result["title"].tolist() == frame["title"].tolist()
+
+
+def test_write_csv_arrow_columns_and_header(frame, tmp_path):
+    file_path = str(tmp_path / "arrow.csv")
+
+    assert CSVManager._write_csv_arrow(
+        frame, file_path, "utf-8", columns=["note_id", "has_brand_info"], header=["笔记ID", "是否有品牌"],
+    )
+
+    raw = open(file_path, "rb").read()
+    assert not raw.startswith("\ufeff".encode("utf-8"))
+    result = pd.read_csv(file_path, encoding="utf-8")
+    assert result.columns.tolist() == ["笔记ID", "是否有品牌"]
+    assert result["是否有品牌"].tolist() == [True, False, True]
+
+
+def test_write_csv_arrow_without_header(frame, tmp_path):
+    file_path = str(tmp_path / "arrow.csv")
+
+    assert CSVManager._write_csv_arrow(frame, file_path, "utf-8", header=False)
+
+    result = pd.read_csv(file_path, header=None)
+    assert len(result) == len(frame)
+    assert result[0].tolist() == frame["note_id"].tolist()
+
+
+def test_write_csv_arrow_rejects_non_utf8(frame, tmp_path):
+    assert not CSVManager._write_csv_arrow(frame, str(tmp_path / "gbk.csv"), "gbk")
+
+
+def test_write_csv_falls_back_to_pandas_for_non_utf8(frame, tmp_path):
+    file_path = CSVManager.write_csv(frame, str(tmp_path / "gbk.csv"), encoding="gbk", engine="pyarrow")
+
+    result = pd.read_csv(file_path, encoding="gbk")
+    assert result["note_id"].tolist() == ["n1", "n2", "n3"]
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from xhs_public_opinion.tools.sov_calculator_tool import ENGAGEMENT_COLUMNS, TIER_LIMITS, SOVCalculatorTool
+
+
+@pytest.fixture
+def tool():
+    return SOVCalculatorTool()
+
+
+@pytest.fixture
+def brand_records():
+    rng = np.random.default_rng(7)
+    n = 300
+    df = pd.DataFrame({
+        "brand": rng.choice(["卡诗", "潘婷", "多芬", "欧莱雅", "Aveda"], size=n),
+        # 含超出所有档位的排名和档位边界值
+        "rank": np.concatenate([[20, 21, 50, 51, 100, 101], rng.integers(1, 130, size=n - 6)]),
+    })
+    for col in ENGAGEMENT_COLUMNS:
+        df[col] = rng.integers(0, 1000, size=n)
+    return df
+
+
+def _per_tier_loop(df: pd.DataFrame):
+    """逐档位筛选再分组统计（聚合前的实现方式），作为对照"""
+    expected = {}
+    for tier, limit in TIER_LIMITS.items():
+        tier_df = df[df["rank"] <= limit].reset_index(drop=True)
+        weights = 1 / (tier_df["rank"] + 1)
+        grouped = tier_df.assign(
+            weight=weights,
+            engagement=tier_df[ENGAGEMENT_COLUMNS].sum(axis=1),
+            position=df.index[df["rank"] <= limit],
+        ).groupby("brand")
+        expected[tier] = {
+            "brands": grouped.size().index.tolist(),
+            "mention_count": grouped.size().to_numpy(),
+            "first_seen": grouped["position"].min().to_numpy(),
+            "rank_sum": grouped["rank"].sum().to_numpy(),
+            "weighted_score": grouped["weight"].sum().to_numpy(),
+            "total_engagement": grouped["engagement"].sum().to_numpy(),
+            "total_records": len(tier_df),
+            "total_weight": weights.sum(),
+            "tier_engagement": tier_df[ENGAGEMENT_COLUMNS].to_numpy().sum(),
+        }
+    return expected
+
+
+def test_aggregate_brand_tiers_matches_per_tier_loop(tool, brand_records):
+    brands, brand_stats, tier_totals = tool._aggregate_brand_tiers(brand_records, with_engagement=True)
+
+    for j, (tier, expected) in enumerate(_per_tier_loop(brand_records).items()):
+        present = brand_stats["mention_count"][:, j] > 0
+        assert brands[present].tolist() == expected["brands"], tier
+        np.testing.assert_array_equal(brand_stats["mention_count"][present, j], expected["mention_count"])
+        np.testing.assert_array_equal(brand_stats["first_seen"][present, j], expected["first_seen"])
+        np.testing.assert_allclose(brand_stats["rank_sum"][present, j], expected["rank_sum"])
+        np.testing.assert_allclose(brand_stats["weighted_score"][present, j], expected["weighted_score"])
+        np.testing.assert_allclose(brand_stats["total_engagement"][present, j], expected["total_engagement"])
+        assert tier_totals["total_records"][j] == expected["total_records"]
+        assert tier_totals["total_weight"][j] == pytest.approx(expected["total_weight"])
+        assert tier_totals["total_engagement"][j] == pytest.approx(expected["tier_engagement"])
+
+
+def test_aggregate_brand_tiers_without_engagement(tool, brand_records):
+    _, brand_stats, tier_totals = tool._aggregate_brand_tiers(brand_records.drop(columns=ENGAGEMENT_COLUMNS))
+
+    assert "total_engagement" not in brand_stats
+    assert "total_engagement" not in tier_totals
+
+
+def test_read_sov_input_fills_missing_engagement(tool, tmp_path):
+    csv_file = tmp_path / "merged_data_20250601.csv"
+    csv_file.write_text('rank,brand_list,has_brand_info,title\n1,"[""卡诗""]",True,标题\n', encoding="utf-8-sig")
+
+    df = tool._read_sov_input(str(csv_file))
+
+    assert set(df.columns) == {"rank", "brand_list", "has_brand_info", *ENGAGEMENT_COLUMNS}
+    assert df[ENGAGEMENT_COLUMNS].to_numpy().tolist() == [[0, 0, 0, 0]]